@@ -0,0 +1,93 @@
+"""
+Created: October, 2026
+
+Benchmark the time taken to import the plugin and create a step, as MAP Client does when scanning for plugins.
+
+Usage:
+
+    python benchmarks/benchmark_import.py [--budget 100] [--repeat 5]
+
+The plugin is imported and a step created in fresh interpreters, after the MAP Client modules it
+needs, and the time is reported as the best of the repeats. Fails if this takes longer than the
+budget in milliseconds, or if it imports any of the modules only needed once the step is used.
+"""
+import sys
+import json
+import argparse
+import subprocess
+
+PLUGIN_PACKAGE = 'mapclientplugins.autosegmentationstep'
+# Modules already loaded by MAP Client before it scans for plugins.
+HOST_MODULES = ('PySide6.QtGui', 'PySide6.QtWidgets', 'mapclient.mountpoints.workflowstep')
+# Modules which must not be imported until the step is configured or executed.
+DEFERRED_MODULES = (
+    f'{PLUGIN_PACKAGE}.configuredialog',
+    f'{PLUGIN_PACKAGE}.resources_rc',
+    f'{PLUGIN_PACKAGE}.model.autosegmentationmodel',
+    f'{PLUGIN_PACKAGE}.scene.autosegmentationscene',
+    f'{PLUGIN_PACKAGE}.widgets.autosegmentationwidget',
+    'cmlibs.zinc',
+    'cmlibs.widgets',
+    'numpy',
+    'PIL',
+)
+DEFAULT_BUDGET_MS = 100.0
+
+_IMPORT_SCRIPT = f'''
+import sys, json, time
+for name in {HOST_MODULES!r}:
+    __import__(name)
+before = set(sys.modules)
+start = time.perf_counter()
+import {PLUGIN_PACKAGE}
+{PLUGIN_PACKAGE}.step.AutoSegmentationStep('')
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "modules": sorted(set(sys.modules) - before)}}))
+'''
+
+
+def measure_import():
+    """
+    Import the plugin and create a step in a fresh interpreter, as MAP Client does when scanning for plugins.
+
+    :return: Seconds taken and the names of the modules the plugin imported.
+    """
+    output = subprocess.run([sys.executable, '-c', _IMPORT_SCRIPT], check=True, capture_output=True, text=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    return result["seconds"], result["modules"]
+
+
+def find_deferred_modules(modules):
+    return [name for name in modules if any(name == deferred or name.startswith(deferred + '.') for deferred in DEFERRED_MODULES)]
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Benchmark the import time of the plugin.')
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET_MS, help='maximum import time in milliseconds')
+    parser.add_argument('--repeat', type=int, default=5, help='number of fresh interpreters to import the plugin in')
+    arguments = parser.parse_args(args)
+
+    timings = []
+    modules = []
+    for _ in range(max(1, arguments.repeat)):
+        seconds, modules = measure_import()
+        timings.append(seconds)
+
+    best = min(timings) * 1000.0
+    print(f"import {PLUGIN_PACKAGE}: {best:.1f} ms best of {len(timings)}, {len(modules)} modules imported")
+    failed = False
+    deferred = find_deferred_modules(modules)
+    if deferred:
+        print("imported modules which should be deferred until the step is used:")
+        for name in deferred:
+            print(f"  {name}")
+        failed = True
+    if best > arguments.budget:
+        print(f"import time exceeds the budget of {arguments.budget:.1f} ms")
+        failed = True
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
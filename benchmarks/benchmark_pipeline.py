@@ -0,0 +1,187 @@
+"""
+Created: October, 2026
+
+Benchmark each stage of the segmentation pipeline on synthetic phantom volumes.
+
+Usage:
+
+    python benchmarks/benchmark_pipeline.py [--sizes 64 128 256] [--phantoms sphere shells noisy-torus] [--memory] [--json results.json]
+
+Every stage is run headless, without the Qt user interface, and reported with its time and
+throughput. With --memory the pipeline is run a second time, tracing the peak memory allocated
+by Python and NumPy in each stage, so that tracing does not slow the timed run. Memory allocated
+inside Zinc is not traced and only shows in the peak resident size of the process.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import resource
+import tracemalloc
+
+from phantoms import PHANTOMS, write_phantom_stack
+
+from mapclientplugins.autosegmentationstep.batch import ImageStack
+from mapclientplugins.autosegmentationstep.model.autosegmentationmodel import (
+    AutoSegmentationModel, ISOSURFACE_ENGINES, ISOSURFACE_ENGINE_NUMPY)
+from mapclientplugins.autosegmentationstep.model.pointsampler import POINT_SAMPLING_POISSON_DISK, POINT_SAMPLING_RANDOM
+from mapclientplugins.autosegmentationstep.model.threshold import THRESHOLD_METHOD_OTSU
+from mapclientplugins.autosegmentationstep.model.volumecache import VOLUME_CACHE_DIRECTORY
+from mapclientplugins.autosegmentationstep.scene.autosegmentationscene import AutoSegmentationScene, get_slider_value
+
+DEFAULT_SIZES = (64, 128, 256)
+MAXIMUM_SIZE = 1024
+# Points generated per voxel of surface area.
+POINT_DENSITY = 0.5
+
+
+class StageResult(object):
+
+    def __init__(self, name, seconds, count, unit, peak_memory=None):
+        self._name = name
+        self._seconds = seconds
+        self._count = count
+        self._unit = unit
+        self._peak_memory = peak_memory
+
+    def get_name(self):
+        return self._name
+
+    def get_seconds(self):
+        return self._seconds
+
+    def get_throughput(self):
+        return self._count / self._seconds if self._seconds > 0.0 else float('inf')
+
+    def get_peak_memory(self):
+        return self._peak_memory
+
+    def set_peak_memory(self, peak_memory):
+        self._peak_memory = peak_memory
+
+    def as_dict(self):
+        return {
+            "stage": self._name,
+            "seconds": self._seconds,
+            "count": self._count,
+            "unit": self._unit,
+            "throughput": self.get_throughput(),
+            "peak-memory": self._peak_memory,
+        }
+
+    def __str__(self):
+        memory = "" if self._peak_memory is None else f" {self._peak_memory / 1024 ** 2:10.1f} MiB"
+        return f"  {self._name:<20} {self._seconds:9.3f} s {self.get_throughput():14,.0f} {self._unit}/s{memory}"
+
+
+def _run_stage(name, unit, function, count=None):
+    """
+    Run a pipeline stage, tracing its peak memory if tracemalloc is tracing.
+
+    :param count: Number of items processed, or a function of the stage result giving it.
+    :return: Stage result and the value returned by the function.
+    """
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.reset_peak()
+        start_memory = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    value = function()
+    seconds = time.perf_counter() - start
+    peak_memory = tracemalloc.get_traced_memory()[1] - start_memory if tracing else None
+    return StageResult(name, seconds, count(value) if callable(count) else count, unit, peak_memory), value
+
+
+def benchmark_phantom(name, size, engine, directory, seed=0):
+    """
+    Run every stage of the pipeline on a phantom written to the directory.
+
+    With the Zinc engine the contour stage times the in-memory export of the contour graphics,
+    which is how that engine's surface is extracted.
+
+    :return: List of StageResult.
+    """
+    voxel_count = size ** 3
+    image_directory = os.path.join(directory, 'images')
+    write_phantom_stack(name, size, image_directory, seed)
+
+    results = []
+
+    def _stage(stage_name, unit, function, count=None):
+        result, value = _run_stage(stage_name, unit, function, count)
+        results.append(result)
+        return value
+
+    cache_location = os.path.join(directory, VOLUME_CACHE_DIRECTORY)
+    model = _stage('load', 'voxels', lambda: AutoSegmentationModel(ImageStack([image_directory]), cache_location), voxel_count)
+    scene = _stage('scene', 'voxels', lambda: AutoSegmentationScene(model), voxel_count)
+    _stage('histogram', 'voxels', model.get_histogram_data, voxel_count)
+    threshold = model.calculate_threshold(THRESHOLD_METHOD_OTSU)
+    scene.set_isosurface_engine(engine)
+    scene.set_segmentation_value(get_slider_value(threshold))
+    scene.set_segmentation_visibility(1)
+
+    surface_cache = model.get_surface_cache()
+    surface_cache.clear()
+    surface = _stage('contour', 'triangles', model.get_segmentation_surface, lambda s: s.get_triangle_count())
+    triangle_count = surface.get_triangle_count()
+    for sampling in (POINT_SAMPLING_RANDOM, POINT_SAMPLING_POISSON_DISK):
+        _stage(f'points {sampling}', 'points', lambda: model.generate_points(POINT_DENSITY, sampling=sampling), lambda _: model.get_node_set().getSize())
+    _stage('mesh export', 'triangles', lambda: model.write_segmentation_mesh(os.path.join(directory, 'segmentation-graphics.exf')), triangle_count)
+    _stage('connectivity', 'triangles', model.generate_connected_segmentation_mesh, triangle_count)
+
+    return results
+
+
+def _benchmark_in_directory(name, size, engine, seed):
+    directory = tempfile.mkdtemp(prefix=f'{name}-{size}-')
+    try:
+        return benchmark_phantom(name, size, engine, directory, seed)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Benchmark the segmentation pipeline on synthetic phantom volumes.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES), help=f'edge lengths of the phantom volumes in voxels, up to {MAXIMUM_SIZE}')
+    parser.add_argument('--phantoms', nargs='+', choices=sorted(PHANTOMS), default=list(PHANTOMS), help='phantoms to segment')
+    parser.add_argument('--engine', choices=sorted(ISOSURFACE_ENGINES), default=ISOSURFACE_ENGINE_NUMPY, help='surface engine')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the phantom noise')
+    parser.add_argument('--memory', action='store_true', help='also measure the peak memory of each stage, in a separate traced run')
+    parser.add_argument('--json', help='write the results to a JSON file')
+    arguments = parser.parse_args(args)
+    if any(size < 2 or size > MAXIMUM_SIZE for size in arguments.sizes):
+        parser.error(f'sizes must be between 2 and {MAXIMUM_SIZE}')
+
+    summaries = []
+    for name in arguments.phantoms:
+        for size in arguments.sizes:
+            results = _benchmark_in_directory(name, size, arguments.engine, arguments.seed)
+            if arguments.memory:
+                tracemalloc.start()
+                try:
+                    memory_results = _benchmark_in_directory(name, size, arguments.engine, arguments.seed)
+                finally:
+                    tracemalloc.stop()
+                for result, memory_result in zip(results, memory_results):
+                    result.set_peak_memory(memory_result.get_peak_memory())
+
+            print(f"{name} {size}^3:")
+            for result in results:
+                print(result)
+            summaries.append({"phantom": name, "size": size, "engine": arguments.engine, "stages": [result.as_dict() for result in results]})
+
+    # Kilobytes on Linux.
+    print(f"peak resident size: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MiB")
+    if arguments.json:
+        with open(arguments.json, 'w') as f:
+            json.dump(summaries, f, indent=4)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""
+Created: October, 2026
+
+Synthetic phantom image volumes for benchmarking the segmentation pipeline.
+"""
+import os
+
+import numpy as np
+
+from PIL import Image
+
+PHANTOM_BACKGROUND = 20
+# Width of the blurred edge of a phantom in voxels.
+EDGE_WIDTH = 1.5
+
+
+def _normalised_coordinates(size, k):
+    # Coordinates of the voxel centres of slice k in [-1, 1].
+    axis = (np.arange(size, dtype=np.float32) + 0.5) * (2.0 / size) - 1.0
+    x, y = np.meshgrid(axis, axis, indexing='ij')
+    return x, y, np.float32(axis[k])
+
+
+def _edge(distance, size):
+    # Smooth step from 1 inside (negative distance) to 0 outside, over EDGE_WIDTH voxels.
+    return 1.0 / (1.0 + np.exp(distance * (size / (2.0 * EDGE_WIDTH))))
+
+
+def sphere_slice(size, k, rng):
+    x, y, z = _normalised_coordinates(size, k)
+    radius = np.sqrt(x * x + y * y + z * z)
+    return PHANTOM_BACKGROUND + 200 * _edge(radius - 0.6, size)
+
+
+def shells_slice(size, k, rng):
+    """
+    Three nested spherical shells of decreasing intensity outwards.
+    """
+    x, y, z = _normalised_coordinates(size, k)
+    radius = np.sqrt(x * x + y * y + z * z)
+    values = np.full(radius.shape, PHANTOM_BACKGROUND, dtype=np.float32)
+    for shell_radius, intensity in ((0.3, 230), (0.5, 160), (0.7, 100)):
+        values += (intensity - PHANTOM_BACKGROUND) * _edge(np.abs(radius - shell_radius) - 0.05, size)
+
+    return values
+
+
+def noisy_torus_slice(size, k, rng):
+    x, y, z = _normalised_coordinates(size, k)
+    ring_distance = np.sqrt(x * x + y * y) - 0.55
+    tube_distance = np.sqrt(ring_distance * ring_distance + z * z)
+    return PHANTOM_BACKGROUND + 180 * _edge(tube_distance - 0.2, size) + rng.normal(0.0, 12.0, x.shape)
+
+
+PHANTOMS = {
+    'sphere': sphere_slice,
+    'shells': shells_slice,
+    'noisy-torus': noisy_torus_slice,
+}
+
+
+def iterate_phantom_slices(name, size, seed=0):
+    """
+    Generate the (x, y) uint8 slices of a size cubed phantom one at a time.
+    """
+    rng = np.random.default_rng(seed)
+    for k in range(size):
+        yield np.clip(np.rint(PHANTOMS[name](size, k, rng)), 0, 255).astype(np.uint8)
+
+
+def write_phantom_stack(name, size, directory, seed=0):
+    """
+    Write a phantom as a stack of PNG images, one per slice, in the orientation read by the step.
+
+    :return: List of the image file names.
+    """
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+
+    image_files = []
+    for k, image_slice in enumerate(iterate_phantom_slices(name, size, seed)):
+        image_file = os.path.join(directory, f"{name}-{k:04d}.png")
+        # Image rows run from the top down, the volume rows from the bottom up.
+        Image.fromarray(np.ascontiguousarray(image_slice.T[::-1])).save(image_file)
+        image_files.append(image_file)
+
+    return image_files
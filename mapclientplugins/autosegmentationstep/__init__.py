@@ -22,6 +22,9 @@ __author__ = 'Hugh Sorby'
 __stepname__ = 'Automatic Segmenter'
 __location__ = 'https://github.com/mapclient-plugins/mapclientplugins.autosegmentationstep'
 
-from mapclientplugins.autosegmentationstep import step
-
-from . import resources_rc
+try:
+    from mapclientplugins.autosegmentationstep import step
+except ModuleNotFoundError as e:
+    # The model, the batch runner and their tests can be used without MAP Client and Qt, which the step needs.
+    if e.name not in ('mapclient', 'PySide6'):
+        raise
@@ -0,0 +1,304 @@
+"""
+Created: October, 2026
+
+Headless segmentation of image stacks without the Qt user interface.
+
+Usage:
+
+    python -m mapclientplugins.autosegmentationstep.batch IMAGES [IMAGES ...] --settings settings.json --output DIRECTORY
+
+IMAGES are image files or directories of image files. The settings file is the settings.json
+written by the step, the contour value, scaling, region of interest, tessellation, point density,
+targeted mode and surface engine settings are used. A point-count setting samples that many points
+instead of using the point density, point-seed sets the seed of the point sampling and a
+point-sampling setting of poisson-disk spreads the points evenly. With --threshold, or a threshold-method
+setting, the contour value is picked from the image histogram instead. The point cloud and
+segmentation mesh are written to point-cloud.exf and segmentation-graphics.exf in the output directory.
+
+With --each, every IMAGES directory is segmented as a separate stack in a pool of worker
+processes, the outputs are written to the DIRECTORY sub-directory of each stack.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import traceback
+import multiprocessing
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from PIL import Image
+
+from mapclientplugins.autosegmentationstep.model.pointsampler import DEFAULT_POINT_SEED, POINT_SAMPLING_RANDOM
+from mapclientplugins.autosegmentationstep.model.volumecache import VOLUME_CACHE_DIRECTORY
+from mapclientplugins.autosegmentationstep.model.threshold import parse_threshold_method
+from mapclientplugins.autosegmentationstep.tracing import enable_tracing, disable_tracing
+
+# The Zinc model and scene are imported when a stack is segmented, so that stacks can be found
+# and their memory estimated without Zinc.
+
+# Extensions of the image files found in stack directories, formats read by Pillow, which the memory estimate uses.
+IMAGE_FILE_EXTENSIONS = ('.bmp', '.gif', '.jpeg', '.jpg', '.png', '.tif', '.tiff')
+POINT_CLOUD_FILENAME = 'point-cloud.exf'
+SEGMENTATION_GRAPHICS_FILENAME = 'segmentation-graphics.exf'
+DEFAULT_STACK_OUTPUT_DIRECTORY = 'auto-segmentation'
+# Peak memory of a segmentation relative to the size of the decoded image volume.
+MEMORY_PER_VOLUME_BYTE = 6
+
+
+class ImageStack(object):
+    """
+    Image data for the model from a list of image files or directories of image files.
+    """
+
+    def __init__(self, paths):
+        self._image_files = []
+        for path in paths:
+            if os.path.isdir(path):
+                image_files = (os.path.join(path, f) for f in os.listdir(path) if f.lower().endswith(IMAGE_FILE_EXTENSIONS))
+                self._image_files.extend(sorted(f for f in image_files if os.path.isfile(f)))
+            else:
+                self._image_files.append(path)
+
+    def image_files(self):
+        return self._image_files
+
+
+def load_settings(filename):
+    if filename is None or not os.path.isfile(filename):
+        return {}
+
+    with open(filename) as f:
+        return json.load(f)
+
+
+def _parse_vector(text, value_type):
+    return [value_type(x.strip()) for x in text.split(',')]
+
+
+def apply_settings(model, scene, settings):
+    """
+    Apply the segmentation settings saved by the step to the model and scene.
+
+    The settings only mark the segmentation surface stale, it is extracted once when first used.
+    """
+    from mapclientplugins.autosegmentationstep.scene.autosegmentationscene import get_slider_value, parse_region_of_interest
+
+    scene.set_isosurface_engine(settings.get("isosurface-engine", model.get_isosurface_engine()))
+    threshold_method = settings.get("threshold-method")
+    if not threshold_method:
+        scene.set_segmentation_value(int(settings.get("contour-value", "0")))
+
+    scaling = settings.get("scaling", "1, 1, 1")
+    if scaling:
+        model.set_scale(_parse_vector(scaling, float))
+        scene.update_scale()
+
+    scene.set_region_of_interest(parse_region_of_interest(settings.get("region-of-interest", "")))
+    dimensions = model.get_dimensions()
+
+    tessellation = settings.get("tessellation")
+    if tessellation:
+        scene.set_tessellation_divisions(_parse_vector(tessellation, int))
+
+    model.set_targeted_mode(settings.get("target-specific", False))
+    scene.targeted_mode_changed()
+    if threshold_method:
+        # Pick the threshold from the histogram of the region of interest instead of the saved contour value.
+        scene.set_segmentation_value(get_slider_value(model.calculate_threshold(*parse_threshold_method(threshold_method))))
+
+    min_dim = max(1, min(dimensions))
+    return float(settings.get("point-density", f'{10000 / min_dim ** 2}'))
+
+
+class _Timer(object):
+
+    def __init__(self):
+        self._timings = []
+
+    def __call__(self, name, function, *args):
+        start = time.perf_counter()
+        result = function(*args)
+        self._timings.append((name, time.perf_counter() - start))
+        return result
+
+    def get_timings(self):
+        return self._timings
+
+
+def segment(image_paths, settings, output_location, cache_location=None):
+    """
+    Segment an image stack with the given settings, writing the point cloud and
+    segmentation mesh to the output location.
+
+    :return: List of (stage name, seconds) timings.
+    """
+    from mapclientplugins.autosegmentationstep.model.autosegmentationmodel import AutoSegmentationModel
+    from mapclientplugins.autosegmentationstep.scene.autosegmentationscene import AutoSegmentationScene
+
+    timer = _Timer()
+    model = timer('load', AutoSegmentationModel, ImageStack(image_paths), cache_location)
+    scene = timer('scene', AutoSegmentationScene, model)
+    point_density = timer('settings', apply_settings, model, scene, settings)
+
+    scene.set_image_plane_visibility(0)
+    scene.set_segmentation_visibility(1)
+    point_count = settings.get("point-count")
+    timer('points', model.generate_points, point_density, None if point_count is None else int(point_count), settings.get("point-seed", DEFAULT_POINT_SEED),
+          settings.get("point-sampling", POINT_SAMPLING_RANDOM))
+
+    if not os.path.exists(output_location):
+        os.makedirs(output_location)
+    timer('write points', model.write_point_cloud, os.path.join(output_location, POINT_CLOUD_FILENAME))
+    timer('write mesh', model.write_segmentation_mesh, os.path.join(output_location, SEGMENTATION_GRAPHICS_FILENAME))
+
+    return timer.get_timings()
+
+
+def _get_failure_summary(stack):
+    return {"stack": stack, "timings": [], "error": traceback.format_exc()}
+
+
+def _segment_stack(stack, settings, output_location, use_cache):
+    cache_location = os.path.join(output_location, VOLUME_CACHE_DIRECTORY) if use_cache else None
+    try:
+        return {"stack": stack, "timings": segment([stack], settings, output_location, cache_location), "error": None}
+    except Exception:
+        return _get_failure_summary(stack)
+
+
+def estimate_stack_memory(stack):
+    """
+    Estimate the peak memory in bytes needed to segment an image stack from the size of its first image.
+    """
+    image_files = ImageStack([stack]).image_files()
+    if not image_files:
+        return 0
+
+    with Image.open(image_files[0]) as image:
+        width, height = image.size
+        bytes_per_pixel = max(1, len(image.getbands())) * (2 if image.mode.startswith('I;16') or image.mode in ('I', 'F') else 1)
+
+    return width * height * len(image_files) * bytes_per_pixel * MEMORY_PER_VOLUME_BYTE
+
+
+def get_available_memory():
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def get_worker_count(stack_memory, max_workers=None):
+    """
+    Get the number of worker processes for segmenting stacks needing the given estimates of
+    memory in bytes, limited by the number of processors and by the memory available for the largest stack.
+    """
+    worker_count = min(len(stack_memory), max_workers or os.cpu_count() or 1)
+    available_memory = get_available_memory()
+    largest_stack = max(stack_memory, default=0)
+    if available_memory is not None and largest_stack > 0:
+        worker_count = min(worker_count, available_memory // largest_stack)
+
+    return max(1, worker_count)
+
+
+def segment_stacks(stacks, settings, output_directory=DEFAULT_STACK_OUTPUT_DIRECTORY, max_workers=None, use_cache=True, progress_callback=None):
+    """
+    Segment every image stack directory with the same settings in a pool of worker processes,
+    each with its own Zinc context. The outputs of each stack are written to the output
+    directory under the stack, which must not be shared by two stacks.
+
+    :return: Summary of each stack, in the order given, with its timings or the error that stopped it.
+    """
+    output_locations = {stack: os.path.normpath(os.path.join(stack, output_directory)) for stack in stacks}
+    if len(set(output_locations.values())) < len(output_locations):
+        raise ValueError(f"The output directory '{output_directory}' is shared by more than one stack, use a path relative to the stacks.")
+
+    summaries = {}
+    stack_memory = {}
+    for stack in stacks:
+        # A stack which cannot be read fails on its own, without stopping the others.
+        try:
+            stack_memory[stack] = estimate_stack_memory(stack)
+        except Exception:
+            summaries[stack] = _get_failure_summary(stack)
+            if progress_callback is not None:
+                progress_callback(summaries[stack])
+
+    readable_stacks = [stack for stack in stacks if stack in stack_memory]
+    if readable_stacks:
+        worker_count = get_worker_count([stack_memory[stack] for stack in readable_stacks], max_workers)
+        with ProcessPoolExecutor(max_workers=worker_count, mp_context=multiprocessing.get_context('spawn')) as executor:
+            futures = [executor.submit(_segment_stack, stack, settings, output_locations[stack], use_cache) for stack in readable_stacks]
+            for future in as_completed(futures):
+                summary = future.result()
+                summaries[summary["stack"]] = summary
+                if progress_callback is not None:
+                    progress_callback(summary)
+
+    return [summaries[stack] for stack in stacks]
+
+
+def _print_timings(timings):
+    for name, seconds in timings:
+        print(f"{name}: {seconds:.3f} s")
+    print(f"total: {sum(seconds for _, seconds in timings):.3f} s")
+
+
+def _print_stack_summary(summary):
+    if summary["error"] is None:
+        print(f"{summary['stack']}: {sum(seconds for _, seconds in summary['timings']):.3f} s")
+    else:
+        print(f"{summary['stack']}: failed\n{summary['error']}")
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Segment image stacks without the user interface.')
+    parser.add_argument('images', nargs='+', help='image files or directories of image files')
+    parser.add_argument('-s', '--settings', help='settings.json file saved by the Automatic Segmenter step')
+    parser.add_argument('-o', '--output', help='directory to write the outputs to, relative to each stack with --each')
+    parser.add_argument('-t', '--threshold', help='pick the contour value from the image histogram with otsu, multi-otsu[:INDEX] or percentile:PERCENT')
+    parser.add_argument('--no-cache', action='store_true', help='do not cache the decoded image volume in the output directory')
+    parser.add_argument('--each', action='store_true', help='segment every image directory as a separate stack in parallel')
+    parser.add_argument('-j', '--workers', type=int, help='maximum number of worker processes used with --each')
+    parser.add_argument('--trace', help='write a Chrome trace of the pipeline stages to this file, without --each')
+    parser.add_argument('--summary', help='write a JSON summary of the timings and failures of every stack used with --each')
+    arguments = parser.parse_args(args)
+
+    settings = load_settings(arguments.settings)
+    if arguments.threshold:
+        try:
+            parse_threshold_method(arguments.threshold)
+        except ValueError as e:
+            parser.error(str(e))
+        settings["threshold-method"] = arguments.threshold
+    if arguments.each:
+        if arguments.output and os.path.isabs(arguments.output):
+            parser.error('-o/--output must be a relative path with --each, the outputs of each stack are written under it in the stack')
+        summaries = segment_stacks(arguments.images, settings, arguments.output or DEFAULT_STACK_OUTPUT_DIRECTORY, arguments.workers,
+                                   not arguments.no_cache, _print_stack_summary)
+        if arguments.summary:
+            with open(arguments.summary, 'w') as f:
+                json.dump(summaries, f, indent=4)
+        failures = [summary for summary in summaries if summary["error"] is not None]
+        print(f"{len(summaries) - len(failures)} of {len(summaries)} stacks segmented.")
+        return 1 if failures else 0
+
+    if arguments.output is None:
+        parser.error('the following arguments are required: -o/--output')
+
+    cache_location = None if arguments.no_cache else os.path.join(arguments.output, VOLUME_CACHE_DIRECTORY)
+    if arguments.trace:
+        enable_tracing(arguments.trace)
+    try:
+        _print_timings(segment(arguments.images, settings, arguments.output, cache_location))
+    finally:
+        disable_tracing()
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
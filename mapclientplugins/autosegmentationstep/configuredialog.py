@@ -73,7 +73,8 @@ class ConfigureDialog(QtWidgets.QDialog):
         """
         self._previousIdentifier = self._ui.lineEdit0.text()
         config = {
-            'identifier': self._ui.lineEdit0.text()
+            'identifier': self._ui.lineEdit0.text(),
+            'prefetch': self._ui.prefetchCheckBox.isChecked(),
         }
         return config
 
@@ -85,3 +86,4 @@ class ConfigureDialog(QtWidgets.QDialog):
         """
         self._previousIdentifier = config['identifier']
         self._ui.lineEdit0.setText(config['identifier'])
+        self._ui.prefetchCheckBox.setChecked(config.get('prefetch', False))
@@ -3,10 +3,16 @@ Created: April, 2023
 
 @author: tsalemink
 """
-import math
+import json
+import hashlib
+import threading
+
+import numpy as np
 
 from cmlibs.zinc.context import Context
 from cmlibs.zinc.field import Field, FieldImage
+from cmlibs.zinc.streamscene import StreaminformationScene
+from cmlibs.zinc.streamimage import StreaminformationImage
 
 from cmlibs.utils.zinc.finiteelement import create_cube_element, create_square_element
 from cmlibs.utils.zinc.field import create_field_coordinates, create_field_visibility_for_plane
@@ -14,21 +20,129 @@ from cmlibs.utils.zinc.node import get_field_values
 from cmlibs.utils.zinc.general import ChangeManager
 from cmlibs.utils.geometry.plane import ZincPlane
 
-from cmlibs.maths.vectorops import add, cross, matrix_vector_mult, angle, axis_angle_to_rotation_matrix
+from cmlibs.maths.vectorops import add, cross, magnitude, matrix_vector_mult, angle, axis_angle_to_rotation_matrix
 from cmlibs.maths.algorithms import calculate_centroid
 from cmlibs.zinc.result import RESULT_OK
 
+from mapclientplugins.autosegmentationstep.model.blockindex import BlockIndex
+from mapclientplugins.autosegmentationstep.model.histogram import calculate_histogram, calculate_volume_histogram, histogram_from_arrays
+from mapclientplugins.autosegmentationstep.model.imagevolume import (
+    PYRAMID_FACTORS, IntensityVolume, build_pyramid, encode_image_slice, get_component_count, is_image_data_type, read_image_stack,
+    to_intensity)
+from mapclientplugins.autosegmentationstep.model.isosurface import Isosurface, empty_isosurface, extract_isosurface, iterate_isosurface
+from mapclientplugins.autosegmentationstep.model.pointcloud import create_points
+from mapclientplugins.autosegmentationstep.model.pointsampler import (
+    DEFAULT_POINT_SEED, POINT_SAMPLING_POISSON_DISK, POINT_SAMPLING_RANDOM, sample_even_surface_points, sample_surface_points)
+from mapclientplugins.autosegmentationstep.model.surfacecache import DEFAULT_SURFACE_CACHE_SIZE, SurfaceCache
+from mapclientplugins.autosegmentationstep.model.threshold import calculate_threshold, suggest_thresholds
+from mapclientplugins.autosegmentationstep.model.trianglemesh import (
+    TriangleMeshWriter, clear_mesh, create_triangle_mesh, label_connected_triangles, read_ascii_stl, weld_vertices)
+from mapclientplugins.autosegmentationstep.model.volumecache import VolumeCache, generate_volume_key
+from mapclientplugins.autosegmentationstep.tracing import trace_span, traced
+
+SEGMENTATION_CONTOUR_GRAPHICS_NAME = 'segmentation_contour'
+ISOSURFACE_ENGINE_ZINC = 'zinc'
+PREVIEW_MAXIMUM_SIZE = 128
+# Volumes with a float32 intensity larger than this many bytes are processed out of core, from
+# a memory-mapped cache file, and pyramid levels larger than this are not built.
+OUT_OF_CORE_VOLUME_SIZE = 2 * 1024 ** 3
+# Maximum number of voxels in the image fields of a volume processed out of core.
+OUT_OF_CORE_DISPLAY_VOXEL_COUNT = 512 ** 3
+ISOSURFACE_ENGINE_NUMPY = 'numpy'
+ISOSURFACE_ENGINES = {
+    ISOSURFACE_ENGINE_ZINC: 'Zinc contours',
+    ISOSURFACE_ENGINE_NUMPY: 'Voxel isosurface',
+}
+LOAD_PHASE_DECODE = 'Decoding images'
+LOAD_PHASE_IMAGE_FIELDS = 'Creating image fields'
+LOAD_PHASE_ELEMENTS = 'Creating elements'
+LOAD_PHASE_REGIONS = 'Setting up regions'
+LOAD_PHASES = (LOAD_PHASE_DECODE, LOAD_PHASE_IMAGE_FIELDS, LOAD_PHASE_ELEMENTS, LOAD_PHASE_REGIONS)
+
+
+class LoadCancelled(Exception):
+    pass
+
+
+class _RegionData(object):
+    """
+    Block index and image pyramid of the image values in a region of interest, calculated when first used.
+
+    The model replaces its region data whenever the region of interest changes, so a surface extracted
+    on a worker thread is always extracted from the data of the region it was started for. Locks stop
+    threads calculating the same data at the same time.
+    """
+
+    def __init__(self, model, region_of_interest):
+        self._model = model
+        self._region_of_interest = [list(r) for r in region_of_interest]
+        self._block_index = None
+        self._block_index_lock = threading.Lock()
+        self._pyramid = None
+        self._pyramid_lock = threading.Lock()
+
+    def get_region_of_interest(self):
+        return self._region_of_interest
+
+    def get_image_values(self):
+        return self._model.get_region_image_values(self._region_of_interest)
+
+    @traced('get block index')
+    def get_block_index(self):
+        with self._block_index_lock:
+            if self._block_index is None:
+                self._block_index = BlockIndex(self.get_image_values())
+
+            return self._block_index
+
+    @traced('get image pyramid')
+    def get_pyramid(self):
+        with self._pyramid_lock:
+            if self._pyramid is None:
+                self._pyramid = self._model.load_region_pyramid(self._region_of_interest)
+
+            return self._pyramid
+
+    def get_segmentation_values(self, upper_value=None, level=1):
+        """
+        Get the image values at a level of the image pyramid, with values above the upper value read as zero if given.
+        """
+        values = self.get_image_values() if level == 1 else self.get_pyramid()[level]
+        if upper_value is not None:
+            if isinstance(values, IntensityVolume):
+                values = values.with_upper_value(upper_value)
+            else:
+                values = np.where(values > upper_value, np.float32(0.0), values)
+
+        return values
+
+    def get_voxel_offset(self, level=1):
+        # Offset from voxel indices in the region of interest at a pyramid level to image voxel centres.
+        return [start / level + 0.5 for start, _ in self._region_of_interest]
+
 
 class AutoSegmentationModel(object):
-    def __init__(self, input_image_data):
+    """
+    The model is loaded in the LOAD_PHASES in order. If given, the progress callback is called with
+    the phase, the number of steps completed and the total as each phase starts and progresses, the
+    images being decoded one step per slice. Loading stops with LoadCancelled once is_cancelled
+    returns True. The model may be loaded on a worker thread, then used on a single thread.
+    """
+
+    @traced('load model')
+    def __init__(self, input_image_data, cache_location=None, progress_callback=None, surface_cache_size=DEFAULT_SURFACE_CACHE_SIZE, is_cancelled=None):
         self._context = Context('Auto-Segmentation')
 
         self._root_region = self._context.getDefaultRegion()
         self._mesh_region = self._root_region.createChild("segmentation_mesh")
+        self._surface_region = self._root_region.createChild("segmentation_surface")
+        self._preview_region = self._root_region.createChild("segmentation_preview")
         self._detection_region = self._root_region.createChild('detection')
         self._output_region = self._root_region.createChild('output')
         self._root_scene = self._root_region.getScene()
         self._mesh_scene = self._mesh_region.getScene()
+        self._surface_scene = self._surface_region.getScene()
+        self._preview_scene = self._preview_region.getScene()
         self._detection_scene = self._detection_region.getScene()
         self._output_scene = self._output_region.getScene()
         self._field_module = self._root_region.getFieldmodule()
@@ -36,22 +150,50 @@ class AutoSegmentationModel(object):
         self._input_image_data = input_image_data
         self._output_filename = None
 
-        self._source_image_field = self._initialise_image_field()
-        self._dimensions_px = self._source_image_field.getSizeInPixels(3)[1]
+        self._progress_callback = progress_callback
+        self._is_cancelled = is_cancelled
+        self._volume_cache = None if cache_location is None else VolumeCache(cache_location)
+        self._surface_cache = SurfaceCache(surface_cache_size)
+        self._volume_key = generate_volume_key(self._input_image_data.image_files())
+        self._report_progress(LOAD_PHASE_DECODE, 0, len(self._input_image_data.image_files()))
+        self._source_volume = self._load_source_volume()
+        self._image_dimensions = list(self._source_volume.shape[:3])
+        self._region_of_interest = [[0, d] for d in self._image_dimensions]
+        self._dimensions_px = list(self._image_dimensions)
+        self._out_of_core = is_out_of_core_volume(self._source_volume)
+        self._image_values = IntensityVolume(self._source_volume) if self._out_of_core else None
+        self._image_values_lock = threading.Lock()
+        self._region_data = _RegionData(self, self._region_of_interest)
+        self._report_progress(LOAD_PHASE_IMAGE_FIELDS, 0, 1)
+        # The image fields are read from the decoded volume, or for a volume processed out of core from a reduced resolution level of its pyramid.
+        self._source_image_field = self._create_image_field(self._get_display_volume())
+        self._intensity_image_field = self._initialise_intensity_image_field()
+        self._region_offset_field = self._field_module.createFieldConstant([0.0, 0.0, 0.0])
+        self._region_size_field = self._field_module.createFieldConstant([1.0, 1.0, 1.0])
+        self._texture_coordinate_field = self._create_texture_coordinate_field()
         self._scale = [1, 1, 1]
         self._segmentation_value_field = self._field_module.createFieldConstant(0.0)
         self._threshold_field = self._field_module.createFieldConstant(0.0)
         self._targeted_mode = False
         self._image_field, self._filtered_image_field = self._create_value_image_field()
 
+        self._report_progress(LOAD_PHASE_ELEMENTS, 0, 1)
         self._scalar_field = self._create_finite_elements()
 
+        self._report_progress(LOAD_PHASE_REGIONS, 0, 1)
         self._output_coordinates, self._node_set = self._setup_output_region()
-        self._do_histo_calc = False
-        self._histogram = self._calculate_histo_data()
+        self._histogram = None
 
         self._detection_coordinates = self._setup_detection_region()
-        self._mesh_coordinates = self._setup_mesh_region()
+        self._mesh_coordinates, self._connected_surface_field = self._setup_mesh_region()
+        # Zinc contours of a volume processed out of core would only follow its reduced resolution image fields.
+        self._isosurface_engine = ISOSURFACE_ENGINE_NUMPY if self._out_of_core else ISOSURFACE_ENGINE_ZINC
+        self._segmentation_surface_stale = True
+        self._tessellation_divisions = None
+        self._connected_surfaces = None
+        self._connected_surfaces_state = None
+        self._surface_coordinates = self._setup_surface_region()
+        self._preview_coordinates = create_field_coordinates(self._preview_region.getFieldmodule(), managed=True)
 
         self._detection_plane = self._create_detection_plane()
         self._visibility_field = self._create_visibility_field()
@@ -62,6 +204,17 @@ class AutoSegmentationModel(object):
         self._mesh_material = None
         self._plane_material = None
         self._define_materials()
+        self._report_progress(LOAD_PHASE_REGIONS, 1, 1)
+
+    def _report_progress(self, phase, completed, total):
+        if self._is_cancelled is not None and self._is_cancelled():
+            raise LoadCancelled()
+
+        if self._progress_callback is not None:
+            self._progress_callback(phase, completed, total)
+
+    def _report_decode_progress(self, completed, total):
+        self._report_progress(LOAD_PHASE_DECODE, completed, total)
 
     def get_context(self):
         return self._context
@@ -75,6 +228,9 @@ class AutoSegmentationModel(object):
     def get_detection_region(self):
         return self._detection_region
 
+    def get_surface_region(self):
+        return self._surface_region
+
     def get_output_region(self):
         return self._output_region
 
@@ -90,6 +246,12 @@ class AutoSegmentationModel(object):
     def get_detection_scene(self):
         return self._detection_scene
 
+    def get_surface_scene(self):
+        return self._surface_scene
+
+    def get_preview_scene(self):
+        return self._preview_scene
+
     def get_output_scene(self):
         return self._output_scene
 
@@ -106,14 +268,66 @@ class AutoSegmentationModel(object):
         return self._scalar_field
 
     def get_dimensions(self):
+        """
+        Get the dimensions in pixels of the region of interest, which is the whole image unless set.
+        """
         return self._dimensions_px
 
+    def get_image_dimensions(self):
+        return self._image_dimensions
+
+    def get_region_of_interest(self):
+        return self._region_of_interest
+
+    @traced('set region of interest')
+    def set_region_of_interest(self, region_of_interest):
+        """
+        Set the box of voxels [[x0, x1], [y0, y1], [z0, z1]) that is segmented, or the whole image for None.
+
+        The image element and segmentation are restricted to the box, which is clipped to the
+        image and kept at least two voxels wide along each axis where the image allows.
+        The detection plane keeps its orientation and is moved to the centre of the box.
+        The segmentation surface is marked stale, see update_segmentation_surface.
+        """
+        if region_of_interest is None:
+            region_of_interest = [[0, d] for d in self._image_dimensions]
+        self._region_of_interest = _clip_region_of_interest(region_of_interest, self._image_dimensions)
+        self._dimensions_px = [end - start for start, end in self._region_of_interest]
+        # Extractions already running on worker threads keep the data of the previous region.
+        self._region_data = _RegionData(self, self._region_of_interest)
+        self._histogram = None
+        with ChangeManager(self._field_module):
+            self._update_mesh_nodes()
+            field_cache = self._field_module.createFieldcache()
+            self._region_offset_field.assignReal(field_cache, [start / d for (start, _), d in zip(self._region_of_interest, self._image_dimensions)])
+            self._region_size_field.assignReal(field_cache, [r / d for r, d in zip(self._dimensions_px, self._image_dimensions)])
+        self._update_detection_plane()
+        self._segmentation_surface_stale = True
+
+    def get_texture_coordinate_field(self):
+        """
+        Get the field giving the texture coordinates of the image fields over the image element.
+        """
+        return self._texture_coordinate_field
+
+    def get_input_hash(self):
+        """
+        Get a hash identifying the image data and the region of interest segmented from it.
+        """
+        return generate_input_hash(self._volume_key, self._region_of_interest)
+
+    def is_out_of_core(self):
+        return self._out_of_core
+
     def set_targeted_mode(self, state):
         self._targeted_mode = state
+        self._segmentation_surface_stale = True
 
     def set_scale(self, scale):
         self._scale = scale
         self._update_mesh_nodes()
+        self._update_detection_plane()
+        self._segmentation_surface_stale = True
 
     def get_scale(self):
         return self._scale
@@ -127,6 +341,43 @@ class AutoSegmentationModel(object):
     def get_detection_coordinates(self):
         return self._detection_coordinates
 
+    def get_surface_coordinates(self):
+        return self._surface_coordinates
+
+    def get_preview_coordinates(self):
+        return self._preview_coordinates
+
+    def get_tessellation_divisions(self):
+        return self._tessellation_divisions
+
+    def set_tessellation_divisions(self, divisions):
+        self._tessellation_divisions = list(divisions)
+
+    def get_segmentation_state(self):
+        """
+        Get the settings that determine the segmentation surface.
+        """
+        tessellation_divisions = None if self._isosurface_engine == ISOSURFACE_ENGINE_NUMPY else tuple(self._tessellation_divisions or [])
+        region_of_interest = tuple(tuple(r) for r in self._region_of_interest)
+        return self._isosurface_engine, self.get_segmentation_value(), self._targeted_mode, tuple(self._scale), tessellation_divisions, region_of_interest
+
+    def get_surface_cache(self):
+        return self._surface_cache
+
+    def _get_surface_key(self, engine, segmentation_value):
+        """
+        Get the surface cache key of the segmentation surface, from model state that is safe to read on a worker thread.
+        """
+        tessellation_divisions = None if engine == ISOSURFACE_ENGINE_NUMPY else tuple(self._tessellation_divisions or [])
+        return self.get_input_hash(), engine, segmentation_value, self._targeted_mode, tuple(self._scale), tessellation_divisions
+
+    def get_isosurface_engine(self):
+        return self._isosurface_engine
+
+    def set_isosurface_engine(self, engine):
+        self._isosurface_engine = engine
+        self._segmentation_surface_stale = True
+
     def get_node_set(self):
         return self._node_set
 
@@ -160,6 +411,7 @@ class AutoSegmentationModel(object):
         self._mesh_material = material_module.findMaterialByName("blue")
         self._plane_material = material_module.findMaterialByName("green")
 
+    @traced('create finite elements')
     def _create_finite_elements(self):
         self._field_module.beginChange()
 
@@ -175,12 +427,12 @@ class AutoSegmentationModel(object):
         return scalar_field
 
     def _define_node_positions(self):
-        a, b, c = self._dimensions_px
+        (x0, a), (y0, b), (z0, c) = self._region_of_interest
         # Set a stretch factor to centre pixels at integer values.
         s = 0.5
         sx, sy, sz = tuple(self._scale)
-        return [[sx * (0 - s), sy * (0 - s), sz * (0 - s)], [sx * (a - s), sy * (0 - s), sz * (0 - s)], [sx * (0 - s), sy * (b - s), sz * (0 - s)], [sx * (a - s), sy * (b - s), sz * (0 - s)],
-                [sx * (0 - s), sy * (0 - s), sz * (c - s)], [sx * (a - s), sy * (0 - s), sz * (c - s)], [sx * (0 - s), sy * (b - s), sz * (c - s)], [sx * (a - s), sy * (b - s), sz * (c - s)]]
+        return [[sx * (x0 - s), sy * (y0 - s), sz * (z0 - s)], [sx * (a - s), sy * (y0 - s), sz * (z0 - s)], [sx * (x0 - s), sy * (b - s), sz * (z0 - s)], [sx * (a - s), sy * (b - s), sz * (z0 - s)],
+                [sx * (x0 - s), sy * (y0 - s), sz * (c - s)], [sx * (a - s), sy * (y0 - s), sz * (c - s)], [sx * (x0 - s), sy * (b - s), sz * (c - s)], [sx * (a - s), sy * (b - s), sz * (c - s)]]
 
     def _update_mesh_nodes(self):
         node_set = self._field_module.findNodesetByFieldDomainType(Field.DOMAIN_TYPE_NODES)
@@ -195,40 +447,95 @@ class AutoSegmentationModel(object):
             coordinate_field.assignReal(field_cache, node_positions[index])
             node = node_iterator.next()
 
-    def _initialise_image_field(self):
+    @traced('decode image volume')
+    def _load_source_volume(self):
+        return load_source_volume(self._input_image_data.image_files(), self._volume_cache, self._volume_key, self._report_decode_progress)
+
+    def _get_display_volume(self):
+        """
+        Get the volume shown by the image fields, the coarsest level of the image pyramid
+        needed to keep a volume processed out of core within OUT_OF_CORE_DISPLAY_VOXEL_COUNT voxels.
+        """
+        if not self._out_of_core:
+            return self._source_volume
+
+        # The region of interest is the whole image until set, so this is also the pyramid of the image values.
+        factors = self._get_pyramid_factors()
+        if not factors:
+            return self._image_values
+
+        level = factors[-1]
+        for factor in factors:
+            if np.prod(_level_shape(self._image_dimensions, factor), dtype=np.float64) <= OUT_OF_CORE_DISPLAY_VOXEL_COUNT:
+                level = factor
+                break
+
+        return self.get_pyramid()[level]
+
+    @traced('create image field')
+    def _create_image_field(self, volume):
+        """
+        Create an image field from a decoded volume, encoded slice by slice as PNG images in memory,
+        so the image files are only decoded once.
+        """
+        if not is_image_data_type(volume.dtype):
+            volume = (np.clip(volume, 0.0, 1.0) * np.iinfo(np.uint16).max).astype(np.uint16)
+        image_buffers = [encode_image_slice(volume[:, :, k]) for k in range(volume.shape[2])]
+
         with ChangeManager(self._field_module):
             image_field = self._field_module.createFieldImage()
             image_field.setFilterMode(FieldImage.FILTER_MODE_NEAREST)
             image_field.setWrapMode(FieldImage.WRAP_MODE_CLAMP)
 
             stream_information = image_field.createStreaminformationImage()
-            for image_name in self._input_image_data.image_files():
-                stream_information.createStreamresourceFile(image_name)
+            stream_information.setFileFormat(StreaminformationImage.FILE_FORMAT_PNG)
+            for image_buffer in image_buffers:
+                stream_information.createStreamresourceMemoryBuffer(image_buffer)
+
+            result = image_field.read(stream_information)
 
-            print('Image read result:', image_field.read(stream_information))
+        if result != RESULT_OK:
+            raise ValueError(f"Could not read the image volume into an image field, error {result}.")
 
         return image_field
 
+    @traced('create intensity image field')
+    def _initialise_intensity_image_field(self):
+        """
+        Multi-component images are converted to intensity once, when loaded, into a single
+        component image field. The source image field is then only used for display.
+        Volumes processed out of core are shown by a single intensity image field.
+        """
+        if self._out_of_core or get_component_count(self._source_volume) == 1:
+            return self._source_image_field
+
+        self._image_values = to_intensity(self._source_volume)
+        self._source_volume = None
+        return self._create_image_field(self._image_values)
+
+    def _create_texture_coordinate_field(self):
+        """
+        Map the element xi coordinates over the region of interest to the texture
+        coordinates of the image fields, which span the whole image.
+        """
+        with ChangeManager(self._field_module):
+            xi_field = self._field_module.findFieldByName('xi')
+            texture_coordinate_field = self._region_offset_field + xi_field * self._region_size_field
+            self._source_image_field.setDomainField(texture_coordinate_field)
+            # Zinc fields are not hashable, the intensity image field is the source image field for single component images.
+            if self._intensity_image_field is not self._source_image_field:
+                self._intensity_image_field.setDomainField(texture_coordinate_field)
+
+        return texture_coordinate_field
+
+    @traced('create value image field')
     def _create_value_image_field(self):
         with ChangeManager(self._field_module):
             # threshold_segmentation_value_field = self._segmentation_value_field + self._threshold_field
             # const_two_field = self._field_module.createFieldConstant(2)
             const_zero_field = self._field_module.createFieldConstant(0.0)
             # double_segmentation_value_field = const_two_field * threshold_segmentation_value_field
-            image_field = self._source_image_field
-            if image_field.getNumberOfComponents() == 3:
-                # Convert to intensity/grayscale image.
-                component_1 = self._field_module.createFieldComponent(image_field, 1)
-                component_2 = self._field_module.createFieldComponent(image_field, 2)
-                component_3 = self._field_module.createFieldComponent(image_field, 3)
-                # PAL, NTSC scaling.
-                scale_1 = self._field_module.createFieldConstant(0.299)
-                scale_2 = self._field_module.createFieldConstant(0.587)
-                scale_3 = self._field_module.createFieldConstant(0.114)
-                luminance_field = scale_1 * component_1 + scale_2 * component_2 + scale_3 * component_3
-                # image_field = self._field_module.createFieldImageFromSource(luminance_field)
-                image_field = luminance_field
-
+            image_field = self._intensity_image_field
             greater_than_field = image_field > self._segmentation_value_field
             filtered_image_field = self._field_module.createFieldIf(greater_than_field, const_zero_field, image_field)
             # value_diff_field = image_field - threshold_segmentation_value_field
@@ -256,8 +563,17 @@ class AutoSegmentationModel(object):
     def _setup_mesh_region(self):
         field_module = self._mesh_region.getFieldmodule()
         mesh_coordinates = create_field_coordinates(field_module, managed=True)
+        connected_surface_field = field_module.createFieldFiniteElement(1)
+        connected_surface_field.setName('connected_surface')
+        connected_surface_field.setManaged(True)
+
+        return mesh_coordinates, connected_surface_field
+
+    def _setup_surface_region(self):
+        field_module = self._surface_region.getFieldmodule()
+        surface_coordinates = create_field_coordinates(field_module, managed=True)
 
-        return mesh_coordinates
+        return surface_coordinates
 
     def _create_detection_plane(self):
         node_coordinate_set = self._define_node_positions()
@@ -268,6 +584,14 @@ class AutoSegmentationModel(object):
         plane = ZincPlane(field_module)
         plane.setPlaneEquation(plane_normal, point_on_plane)
 
+        field_module = self._detection_region.getFieldmodule()
+        with ChangeManager(field_module):
+            mesh = field_module.findMeshByDimension(2)
+            create_square_element(mesh, self._detection_coordinates, self._define_detection_plane_points(plane_normal, point_on_plane))
+
+        return plane
+
+    def _define_detection_plane_points(self, plane_normal, point_on_plane):
         max_dimension = max(self._dimensions_px)
         half_max_dimension = max_dimension / 2
         p_h_m_d = half_max_dimension
@@ -276,15 +600,30 @@ class AutoSegmentationModel(object):
         element_normal = [0, 0, 1.0]
 
         theta = angle(plane_normal, element_normal)
-        rot_mx = axis_angle_to_rotation_matrix(cross(element_normal, plane_normal), theta)
-        rot_element_points = [add(matrix_vector_mult(rot_mx, pt), point_on_plane) for pt in element_points]
+        axis = cross(element_normal, plane_normal)
+        # A plane normal along the element normal leaves no rotation axis, any axis in the element turns it over.
+        rot_mx = axis_angle_to_rotation_matrix(axis if magnitude(axis) > 0.0 else [1.0, 0.0, 0.0], theta)
+        return [add(matrix_vector_mult(rot_mx, pt), point_on_plane) for pt in element_points]
+
+    def _update_detection_plane(self):
+        # Move the detection plane to the centre of the region of interest, keeping its orientation.
+        point_on_plane = calculate_centroid(self._define_node_positions())
+        plane_normal = self._detection_plane.getNormal()
+        self._detection_plane.setPlaneEquation(plane_normal, point_on_plane)
+        element_points = self._define_detection_plane_points(plane_normal, point_on_plane)
 
         field_module = self._detection_region.getFieldmodule()
         with ChangeManager(field_module):
-            mesh = field_module.findMeshByDimension(2)
-            create_square_element(mesh, self._detection_coordinates, rot_element_points)
-
-        return plane
+            node_set = field_module.findNodesetByFieldDomainType(Field.DOMAIN_TYPE_NODES)
+            field_cache = field_module.createFieldcache()
+            node_iterator = node_set.createNodeiterator()
+            node = node_iterator.next()
+            index = 0
+            while node.isValid():
+                field_cache.setNode(node)
+                self._detection_coordinates.assignReal(field_cache, element_points[index])
+                node = node_iterator.next()
+                index += 1
 
     def _create_visibility_field(self):
         field_module = self._mesh_region.getFieldmodule()
@@ -294,11 +633,194 @@ class AutoSegmentationModel(object):
         return visibility_field
 
     def clear_segmentation_mesh(self):
+        clear_mesh(self._mesh_region.getFieldmodule())
+        self._connected_surfaces_state = None
+
+    @traced('detect connected surfaces')
+    def generate_connected_segmentation_mesh(self):
+        """
+        Create the segmentation mesh in the mesh region and find its connected surfaces.
+
+        The result is kept until the segmentation state changes, so repeated calls for the same
+        state do not recreate the mesh.
+
+        The nodes are labelled with the index of their connected surface, see create_connected_surface_group.
+
+        :return: List of arrays of element identifiers, one per connected surface in order of decreasing size.
+        """
+        state = self.get_segmentation_state()
+        if self._connected_surfaces_state != state:
+            self.clear_segmentation_mesh()
+            surface = self._get_welded_segmentation_surface()
+            vertices, triangles = surface.get_vertices(), surface.get_triangles()
+            labels, component_count = label_connected_triangles(triangles)
+            order = np.argsort(labels, kind='stable')
+            # Triangles sharing a vertex are connected, so every vertex of a triangle has the label of the triangle.
+            vertex_labels = np.full(len(vertices), -1, dtype=np.int64)
+            vertex_labels[np.asarray(triangles, dtype=np.int64).ravel()] = np.repeat(labels, 3)
+            _, element_identifiers = create_triangle_mesh(self._mesh_coordinates, vertices, triangles, self._connected_surface_field, vertex_labels)
+            boundaries = np.searchsorted(labels[order], np.arange(1, component_count))
+            self._connected_surfaces = np.split(element_identifiers[order], boundaries)
+            self._connected_surfaces_state = state
+
+        return self._connected_surfaces
+
+    def create_connected_surface_group(self, index):
+        """
+        Create a field group of the elements of a connected surface found by generate_connected_segmentation_mesh,
+        adding them all at once by the connected surface label of their nodes.
+        """
         field_module = self._mesh_region.getFieldmodule()
-        mesh = field_module.findMeshByDimension(2)
-        mesh.destroyAllElements()
-        node_set = field_module.findNodesetByFieldDomainType(Field.DOMAIN_TYPE_NODES)
-        node_set.destroyAllNodes()
+        with ChangeManager(field_module):
+            field_group = field_module.createFieldGroup()
+            field_group.setName(f"el_group_{index + 1:02}")
+            mesh_group = field_group.createMeshGroup(field_module.findMeshByDimension(2))
+            label_difference = field_module.createFieldAbs(self._connected_surface_field - field_module.createFieldConstant(index))
+            mesh_group.addElementsConditional(label_difference < field_module.createFieldConstant(0.5))
+
+        return field_group
+
+    def get_segmentation_values(self, segmentation_value=None, level=1):
+        upper_value = self._get_iso_values(self.get_segmentation_value() if segmentation_value is None else segmentation_value)[1]
+        return self._region_data.get_segmentation_values(upper_value, level)
+
+    def extract_segmentation_surface(self, segmentation_value=None, is_cancelled=None, level=1):
+        """
+        Extract the segmentation surface from the image values, with vertices in the same
+        coordinates as the segmentation contour graphics.
+
+        The surface is extracted at the current segmentation value unless another value is given.
+        A level greater than one extracts a preview surface from that level of the image pyramid.
+        """
+        return self.create_surface_extraction(segmentation_value, level)(is_cancelled)
+
+    def create_surface_extraction(self, segmentation_value=None, level=1):
+        """
+        Take a snapshot of the model state the segmentation surface is extracted from, on the thread using the model.
+
+        :return: Function extracting the surface, with an optional is_cancelled function. It only uses NumPy
+            arrays and the snapshot, so it can be called on a worker thread.
+        """
+        segmentation_value = self.get_segmentation_value() if segmentation_value is None else segmentation_value
+        key = self._get_surface_key(ISOSURFACE_ENGINE_NUMPY, segmentation_value) if level == 1 else None
+        iso_value, upper_value = self._get_iso_values(segmentation_value)
+        region_data = self._region_data
+        # The centre of a coarse voxel lies at the centre of the fine voxels it averages.
+        scale = [level * s for s in self._scale]
+        surface_cache = self._surface_cache
+
+        @traced('extract voxel isosurface')
+        def _extract_surface(is_cancelled=None):
+            surface = None if key is None else surface_cache.get(key)
+            if surface is not None:
+                return surface
+
+            blocks = region_data.get_block_index().get_active_cells(iso_value, upper_value) if level == 1 else None
+            values = region_data.get_segmentation_values(upper_value, level)
+            surface = extract_isosurface(values, iso_value, blocks=blocks, is_cancelled=is_cancelled)
+            surface = surface.transformed(scale, region_data.get_voxel_offset(level))
+            if key is not None:
+                surface_cache.put(key, surface, surface.get_size())
+
+            return surface
+
+        return _extract_surface
+
+    def iterate_segmentation_surface(self, segmentation_value=None, is_cancelled=None):
+        """
+        Extract the segmentation surface from the image values in slabs along z, with memory
+        use bounded by the slab size rather than the surface size. See iterate_isosurface.
+        """
+        segmentation_value = self.get_segmentation_value() if segmentation_value is None else segmentation_value
+        iso_value, upper_value = self._get_iso_values(segmentation_value)
+        region_data = self._region_data
+        blocks = region_data.get_block_index().get_active_cells(iso_value, upper_value)
+        values = region_data.get_segmentation_values(upper_value)
+        for surface in iterate_isosurface(values, iso_value, blocks=blocks, is_cancelled=is_cancelled):
+            yield surface.transformed(self._scale, region_data.get_voxel_offset())
+
+    def _get_iso_values(self, segmentation_value):
+        iso_value = segmentation_value - self.get_targeted_adjustment_value()
+        upper_value = segmentation_value if self._targeted_mode else None
+        return iso_value, upper_value
+
+    def update_preview_surface(self, surface):
+        field_module = self._preview_region.getFieldmodule()
+        with ChangeManager(field_module):
+            clear_mesh(field_module)
+            create_triangle_mesh(self._preview_coordinates, surface.get_vertices(), surface.get_triangles())
+
+    def is_segmentation_surface_stale(self):
+        """
+        Check whether the segmentation settings changed since the segmentation surface was last updated.
+        """
+        return self._segmentation_surface_stale
+
+    @traced('update segmentation surface')
+    def update_segmentation_surface(self, surface=None):
+        """
+        Show the voxel isosurface for the current settings, extracting it on this thread unless given.
+
+        Changing the segmentation settings only marks the surface stale, so it can be extracted once
+        after all of them are applied, here or on a worker thread with create_surface_extraction.
+        """
+        if self._isosurface_engine != ISOSURFACE_ENGINE_NUMPY:
+            clear_mesh(self._surface_region.getFieldmodule())
+        else:
+            if surface is None:
+                surface = self.extract_segmentation_surface()
+            field_module = self._surface_region.getFieldmodule()
+            with ChangeManager(field_module):
+                clear_mesh(field_module)
+                create_triangle_mesh(self._surface_coordinates, surface.get_vertices(), surface.get_triangles())
+        self._segmentation_surface_stale = False
+
+    @traced('extract contour surface')
+    def extract_contour_surface(self):
+        """
+        Extract the triangles of the segmentation contour graphics in memory.
+        """
+        key = self._get_surface_key(ISOSURFACE_ENGINE_ZINC, self.get_segmentation_value())
+        surface = self._surface_cache.get(key)
+        if surface is not None:
+            return surface
+
+        scene_filter = self._context.getScenefiltermodule().createScenefilterGraphicsName(SEGMENTATION_CONTOUR_GRAPHICS_NAME)
+        stream_information = self._root_scene.createStreaminformationScene()
+        stream_information.setIOFormat(StreaminformationScene.IO_FORMAT_ASCII_STL)
+        stream_information.setScenefilter(scene_filter)
+        memory_resource = stream_information.createStreamresourceMemory()
+        with trace_span('write contour STL'):
+            self._root_scene.write(stream_information)
+            result, buffer = memory_resource.getBuffer()
+        with trace_span('read contour STL', size=len(buffer) if buffer else 0):
+            surface = empty_isosurface() if result != RESULT_OK or not buffer else Isosurface(*read_ascii_stl(buffer))
+        self._surface_cache.put(key, surface, surface.get_size())
+        return surface
+
+    def get_segmentation_surface(self):
+        if self._isosurface_engine == ISOSURFACE_ENGINE_NUMPY:
+            return self.extract_segmentation_surface()
+
+        return self.extract_contour_surface()
+
+    def _get_welded_segmentation_surface(self):
+        key = self._get_surface_key(self._isosurface_engine, self.get_segmentation_value()) + ('welded',)
+        surface = self._surface_cache.get(key)
+        if surface is None:
+            surface = self.get_segmentation_surface()
+            surface = Isosurface(*weld_vertices(surface.get_vertices(), surface.get_triangles()))
+            self._surface_cache.put(key, surface, surface.get_size())
+
+        return surface
+
+    @traced('generate segmentation mesh')
+    def generate_segmentation_mesh(self, coordinate_field):
+        """
+        Create the current segmentation surface as a triangle mesh in the region of the given coordinate field.
+        """
+        surface = self._get_welded_segmentation_surface()
+        create_triangle_mesh(coordinate_field, surface.get_vertices(), surface.get_triangles())
 
     def reverse_visibility_field_direction(self):
         normal = self._detection_plane.getNormal()
@@ -312,59 +834,141 @@ class AutoSegmentationModel(object):
         return get_field_values(self._detection_region, coordinate_field)
 
     def _calculate_histo_data(self):
-        bins = None
-        if self._do_histo_calc:
-            with ChangeManager(self._field_module):
-                field_cache = self._field_module.createFieldcache()
-                mesh = self._field_module.findMeshByDimension(3)
-                element_iterator = mesh.createElementiterator()
-                element = element_iterator.next()
-                dim = self._dimensions_px
-
-                bin_count = 100
-                total = dim[0] * dim[1] * dim[2]
-                bins = [0] * bin_count
-                vals = [0] * bin_count
-
-                data = {"bins": [0] * bin_count}
-                max_value = -math.inf
-                min_value = math.inf
-                for i in range(dim[0]):
-                    for j in range(dim[1]):
-                        for k in range(dim[2]):
-                            xi = [(i + 0.5) / dim[0], (j + 0.5) / dim[1], (k + 0.5) / dim[2]]
-                            field_cache.setMeshLocation(element, xi)
-                            result, value = self._image_field.evaluateReal(field_cache, 1)
-                            max_value = max(max_value, value)
-                            min_value = min(min_value, value)
-                            # Assuming data is already scaled between 0.0 and 1.0.
-                            binned_value = int(bin_count * value)
-                            # Include max_value (currently assuming that this is 1.0) into last bin.
-                            binned_value = binned_value if binned_value < bin_count else bin_count - 1
-                            data["bins"][binned_value] += 1
-                            str_value = f"{value}"
-                            if str_value not in data:
-                                data[str_value] = 0
-                            data[str_value] += 1
-                            # value_index = int(value * (bin_count - 1) + 0.5)
-                            # bins[value_index] += 1
-                            # vals[value_index] = value
-
-                print(data)
-                # print([b for b in bins if b > 0.0])
-                # print([v for v in vals if v != 0.0])
-                # bins = [b / total for b in bins]
-                # print(bins)
-                # print([(bins.index(b), b) for b in bins if b > 0.0])
-        return bins
-
+        # The source volume is released on another thread once the intensity volume is made from it.
+        source_volume = self._source_volume
+        if source_volume is None:
+            return calculate_histogram(self.get_image_values())
+
+        region = tuple(slice(start, end) for start, end in self._region_of_interest)
+        return calculate_volume_histogram(source_volume[region])
+
+    def get_image_values(self):
+        """
+        Get the single channel float32 intensity volume of the region of interest, with values
+        scaled to the range [0, 1].
+
+        For volumes processed out of core this is an IntensityVolume reading the memory-mapped
+        source volume on demand. Otherwise the intensity volume is converted once and the source
+        volume is released, so that only one copy of the image is kept in memory.
+        """
+        return self.get_region_image_values(self._region_of_interest)
+
+    def get_region_image_values(self, region_of_interest):
+        region = tuple(slice(start, end) for start, end in region_of_interest)
+        if self._out_of_core:
+            return IntensityVolume(self._source_volume[region])
+
+        with self._image_values_lock:
+            if self._image_values is None:
+                self._image_values = to_intensity(self._source_volume)
+                self._source_volume = None
+
+        return self._image_values[region]
+
+    def get_block_index(self):
+        return self._region_data.get_block_index()
+
+    def get_pyramid(self):
+        """
+        Get the image pyramid of the region of interest, kept in the volume cache by input hash.
+        """
+        return self._region_data.get_pyramid()
+
+    def load_region_pyramid(self, region_of_interest):
+        """
+        Load the image pyramid of a region of interest from the volume cache, or build it and add it to the cache.
+        """
+        values = self.get_region_image_values(region_of_interest)
+        factors = get_pyramid_factors([end - start for start, end in region_of_interest])
+        input_hash = generate_input_hash(self._volume_key, region_of_interest)
+        pyramid = None if self._volume_cache is None else load_cached_pyramid(self._volume_cache, input_hash, values, factors)
+        if pyramid is None:
+            pyramid = build_pyramid(values, factors)
+            if self._volume_cache is not None:
+                store_cached_pyramid(self._volume_cache, input_hash, pyramid)
+
+        return pyramid
+
+    def _get_pyramid_factors(self):
+        return get_pyramid_factors(self._dimensions_px)
+
+    def get_preview_level(self):
+        """
+        Get the coarsest pyramid level needed to keep previews within PREVIEW_MAXIMUM_SIZE voxels along each axis.
+        """
+        factors = [1] + self._get_pyramid_factors()
+        for factor in factors:
+            if max(self._dimensions_px) <= PREVIEW_MAXIMUM_SIZE * factor:
+                return factor
+
+        return factors[-1]
+
+    @traced('get histogram')
     def get_histogram_data(self):
+        """
+        Get the intensity histogram of the region of interest, kept in the volume cache by input hash.
+        """
+        if self._histogram is None:
+            key = get_histogram_key(self.get_input_hash())
+            arrays = None if self._volume_cache is None else self._volume_cache.load_arrays(key)
+            if arrays is None:
+                self._histogram = self._calculate_histo_data()
+                if self._volume_cache is not None:
+                    self._volume_cache.store_arrays(key, self._histogram.get_arrays())
+            else:
+                self._histogram = histogram_from_arrays(arrays)
+
         return self._histogram
 
-    def generate_points(self, point_density=100):
-        self._node_set.destroyAllNodes()
-        graphics_filter = self._context.getScenefiltermodule().getDefaultScenefilter()
-        self._root_scene.convertToPointCloud(graphics_filter, self._node_set, self._output_coordinates, 0.0, 0.0, point_density, 1.0)
+    def get_threshold_suggestions(self):
+        return suggest_thresholds(self.get_histogram_data())
+
+    def calculate_threshold(self, method, parameter=None):
+        return calculate_threshold(self.get_histogram_data(), method, parameter)
+
+    @traced('generate points')
+    def generate_points(self, point_density=100, point_count=None, seed=DEFAULT_POINT_SEED, sampling=POINT_SAMPLING_RANDOM):
+        """
+        Replace the output datapoints with points sampled over the segmentation surface,
+        point_count points if given, otherwise point_density points per unit area.
+
+        With POINT_SAMPLING_POISSON_DISK sampling the points are evenly spread, no closer to
+        each other than the spacing that number of points allows.
+        """
+        key = self._get_surface_key(self._isosurface_engine, self.get_segmentation_value()) + ('points', sampling, point_density, point_count, seed)
+        coordinates = None if seed is None else self._surface_cache.get(key)
+        if coordinates is None:
+            surface = self.get_segmentation_surface()
+            sample = sample_even_surface_points if sampling == POINT_SAMPLING_POISSON_DISK else sample_surface_points
+            coordinates = sample(surface.get_vertices(), surface.get_triangles(), point_count, point_density, seed)
+            if seed is not None:
+                self._surface_cache.put(key, coordinates, coordinates.nbytes)
+
+        with ChangeManager(self._output_region.getFieldmodule()):
+            self._node_set.destroyAllNodes()
+            create_points(self._node_set, self._output_coordinates, coordinates)
+
+    @traced('write point cloud')
+    def write_point_cloud(self, filename):
+        self._output_region.writeFile(filename)
+
+    @traced('write segmentation mesh')
+    def write_segmentation_mesh(self, filename):
+        temp_region = self._root_region.createChild("__temp")
+        field_module = temp_region.getFieldmodule()
+        coordinate_field = create_field_coordinates(field_module)
+
+        if self._isosurface_engine == ISOSURFACE_ENGINE_NUMPY:
+            # Stream the surface into the mesh slab by slab even if it is cached, so the NumPy memory used is bounded
+            # by the slab size. The slabs give the same mesh as extract_segmentation_surface.
+            writer = TriangleMeshWriter(coordinate_field)
+            for surface in self.iterate_segmentation_surface():
+                writer.write(surface.get_vertices(), surface.get_triangles())
+        else:
+            self.generate_segmentation_mesh(coordinate_field)
+
+        temp_region.writeFile(filename)
+        self._root_region.removeChild(temp_region)
 
     def get_output_filename(self):
         return self._output_filename
@@ -374,10 +978,16 @@ class AutoSegmentationModel(object):
         for i in range(1, logger.getNumberOfMessages() + 1):
             print(f"{i} - {logger.getMessageTextAtIndex(i)}")
 
-    def set_segmentation_value(self, value):
+    def set_segmentation_value(self, value, surface=None):
+        """
+        Set the segmentation value, showing the surface extracted for it if given, otherwise marking the surface stale.
+        """
         field_cache = self._field_module.createFieldcache()
         self._segmentation_value_field.assignReal(field_cache, value)
-        self._calculate_histo_data()
+        if surface is None:
+            self._segmentation_surface_stale = True
+        else:
+            self.update_segmentation_surface(surface)
 
     def get_segmentation_value(self):
         field_cache = self._field_module.createFieldcache()
@@ -390,3 +1000,123 @@ class AutoSegmentationModel(object):
     # Map methods required for Orientation and Translation handlers.
     get_plane = get_detection_plane
     get_plane_region = get_detection_region
+
+
+def generate_input_hash(volume_key, region_of_interest):
+    """
+    Generate a hash identifying the image data and the region of interest segmented from it.
+    """
+    description = [volume_key, [list(r) for r in region_of_interest]]
+    return hashlib.md5(json.dumps(description).encode('utf-8')).hexdigest()
+
+
+def get_histogram_key(input_hash):
+    return f"{input_hash}-histogram"
+
+
+def get_pyramid_key(input_hash, factor):
+    return f"{input_hash}-pyramid-{factor}"
+
+
+def get_pyramid_factors(dimensions):
+    """
+    Get the downsampling factors of the image pyramid of a region with the given dimensions,
+    leaving out levels too large to hold in memory.
+    """
+    return [factor for factor in PYRAMID_FACTORS if _intensity_size(_level_shape(dimensions, factor)) <= OUT_OF_CORE_VOLUME_SIZE]
+
+
+def is_out_of_core_volume(volume):
+    return isinstance(volume, np.memmap) and _intensity_size(volume.shape) > OUT_OF_CORE_VOLUME_SIZE
+
+
+def load_source_volume(image_files, volume_cache=None, volume_key=None, progress_callback=None):
+    """
+    Load the source volume of the image files from the volume cache or decode it, adding it to the cache.
+
+    Volumes too large to process in memory are decoded straight into a memory-mapped
+    file in the cache, which then backs the volume. The volume is pinned in the cache,
+    so adding other data to the cache does not evict it while it is used.
+    """
+    if volume_cache is None:
+        return read_image_stack(image_files, progress_callback=progress_callback)
+
+    key = generate_volume_key(image_files) if volume_key is None else volume_key
+    volume_cache.pin(key)
+    volume = volume_cache.load(key)
+    if volume is not None:
+        return volume
+
+    mapped_files = []
+
+    def _allocate(shape, dtype):
+        if _intensity_size(shape) <= OUT_OF_CORE_VOLUME_SIZE:
+            return np.empty(shape, dtype)
+
+        mapped_volume = volume_cache.allocate(shape, dtype)
+        mapped_files.append(mapped_volume.filename)
+        return mapped_volume
+
+    try:
+        volume = read_image_stack(image_files, progress_callback=progress_callback, allocate=_allocate)
+    except Exception:
+        for mapped_file in mapped_files:
+            volume_cache.discard(mapped_file)
+        raise
+
+    if not mapped_files:
+        volume_cache.store(key, volume)
+        return volume
+
+    # Close the writable memory map before the file is moved into the cache.
+    volume.flush()
+    del volume
+    volume = volume_cache.commit(key, mapped_files[0])
+    if volume is None:
+        raise OSError(f"Could not add the decoded image volume to the volume cache in '{volume_cache.get_location()}'.")
+
+    return volume
+
+
+def load_cached_pyramid(volume_cache, input_hash, values, factors):
+    """
+    Load the levels of an image pyramid from the volume cache.
+
+    :return: Pyramid as built by build_pyramid from the values, or None unless every level is cached.
+    """
+    pyramid = {1: values}
+    for factor in factors:
+        level = volume_cache.load(get_pyramid_key(input_hash, factor))
+        if level is None or list(level.shape) != _level_shape(values.shape, factor):
+            return None
+        pyramid[factor] = level
+
+    return pyramid
+
+
+def store_cached_pyramid(volume_cache, input_hash, pyramid):
+    for factor, level in pyramid.items():
+        if factor != 1:
+            volume_cache.store(get_pyramid_key(input_hash, factor), level)
+
+
+def _clip_region_of_interest(region_of_interest, dimensions):
+    clipped = []
+    for (start, end), size in zip(region_of_interest, dimensions):
+        start = min(max(int(start), 0), size)
+        end = min(max(int(end), start), size)
+        # Keep at least one cell along each axis.
+        if end - start < 2:
+            end = min(start + 2, size)
+            start = max(end - 2, 0)
+        clipped.append([start, end])
+
+    return clipped
+
+
+def _level_shape(shape, factor):
+    return [-(-size // factor) for size in shape[:3]]
+
+
+def _intensity_size(shape):
+    return np.prod(shape[:3], dtype=np.float64) * np.dtype(np.float32).itemsize
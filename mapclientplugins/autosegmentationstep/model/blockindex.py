@@ -0,0 +1,86 @@
+"""
+Created: October, 2026
+
+Minimum and maximum value index over blocks of an image volume.
+"""
+import numpy as np
+
+DEFAULT_BLOCK_SIZE = 16
+
+
+def _reduce_blocks(values, axis, block_size, reduction):
+    size = values.shape[axis]
+    block_count = max(1, -(-(size - 1) // block_size))
+    shape = list(values.shape)
+    shape[axis] = block_count
+    reduced = np.empty(shape, dtype=values.dtype)
+    for block in range(block_count):
+        # Blocks share their boundary grid points so every cell lies entirely inside one block.
+        source = [slice(None)] * values.ndim
+        source[axis] = slice(block * block_size, min((block + 1) * block_size + 1, size))
+        target = [slice(None)] * values.ndim
+        target[axis] = block
+        reduced[tuple(target)] = reduction(values[tuple(source)], axis=axis)
+
+    return reduced
+
+
+class BlockIndex(object):
+    """
+    Minimum and maximum value of every block of cells in an (x, y, z) volume.
+
+    Block (a, b, c) covers the cells [a * block_size, (a + 1) * block_size) in x, and likewise
+    in y and z, including the grid points on its upper boundary. The volume is read one layer
+    of blocks at a time, so memory-mapped volumes need not fit in memory.
+    """
+
+    def __init__(self, values, block_size=DEFAULT_BLOCK_SIZE):
+        self._shape = values.shape[:3]
+        self._block_size = block_size
+        size = self._shape[2]
+        layers = []
+        for z0 in range(0, max(1, size - 1), block_size):
+            layer = np.asarray(values[:, :, z0:min(z0 + block_size + 1, size)])
+            minimum = layer
+            maximum = layer
+            for axis in (1, 0):
+                minimum = _reduce_blocks(minimum, axis, block_size, np.min)
+                maximum = _reduce_blocks(maximum, axis, block_size, np.max)
+            layers.append((minimum.min(axis=2), maximum.max(axis=2)))
+        self._minimum = np.stack([layer[0] for layer in layers], axis=2)
+        self._maximum = np.stack([layer[1] for layer in layers], axis=2)
+
+    def get_block_size(self):
+        return self._block_size
+
+    def get_block_counts(self):
+        return self._minimum.shape
+
+    def get_minimum(self):
+        return self._minimum
+
+    def get_maximum(self):
+        return self._maximum
+
+    def get_active_blocks(self, iso_value, upper_value=None):
+        """
+        Get the indices of the blocks that may contain the surface at iso_value.
+
+        If upper_value is given, values above it are treated as zero, as in the
+        targeted segmentation mode.
+        """
+        above = self._maximum > iso_value
+        below = self._minimum <= iso_value
+        if upper_value is not None:
+            below |= self._maximum > upper_value
+
+        return np.argwhere(above & below)
+
+    def get_block_cells(self, block):
+        """
+        Get the range of cells [[x0, x1], [y0, y1], [z0, z1]) covered by the given block.
+        """
+        return [[b * self._block_size, min((b + 1) * self._block_size, s - 1)] for b, s in zip(block, self._shape)]
+
+    def get_active_cells(self, iso_value, upper_value=None):
+        return [self.get_block_cells(block) for block in self.get_active_blocks(iso_value, upper_value)]
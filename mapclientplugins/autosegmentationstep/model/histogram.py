@@ -0,0 +1,125 @@
+"""
+Created: October, 2026
+
+Vectorised intensity histogram of an image volume.
+"""
+import numpy as np
+
+from mapclientplugins.autosegmentationstep.model.imagevolume import IntensityVolume, get_component_count, is_image_data_type, iterate_slabs
+
+
+class Histogram(object):
+
+    def __init__(self, counts, bin_edges, min_value, max_value, values, value_counts):
+        self._counts = counts
+        self._bin_edges = bin_edges
+        self._min_value = min_value
+        self._max_value = max_value
+        self._values = values
+        self._value_counts = value_counts
+
+    def get_counts(self):
+        return self._counts
+
+    def get_bin_edges(self):
+        return self._bin_edges
+
+    def get_bin_count(self):
+        return len(self._counts)
+
+    def get_range(self):
+        return self._min_value, self._max_value
+
+    def get_values(self):
+        return self._values
+
+    def get_value_counts(self):
+        return self._value_counts
+
+    def get_total(self):
+        return int(self._counts.sum())
+
+    def get_arrays(self):
+        return {"counts": self._counts, "bin_edges": self._bin_edges, "values": self._values, "value_counts": self._value_counts}
+
+
+def histogram_from_arrays(arrays):
+    values = arrays["values"]
+    min_value = float(values[0]) if values.size else 0.0
+    max_value = float(values[-1]) if values.size else 0.0
+    return Histogram(arrays["counts"], arrays["bin_edges"], min_value, max_value, values, arrays["value_counts"])
+
+
+def calculate_histogram(values, bin_count=100):
+    """
+    Calculate a histogram of the given intensity values.
+
+    Values are assumed to be scaled between 0.0 and 1.0, the maximum value is included
+    in the last bin. Exact counts for every distinct value are also recorded. Volumes
+    are read in slabs of z planes, so memory-mapped volumes need not fit in memory.
+    """
+    counts = np.zeros(bin_count, dtype=np.int64)
+    unique_values = np.empty(0, dtype=values.dtype)
+    value_counts = np.empty(0, dtype=np.int64)
+    slabs = iterate_slabs(values) if np.ndim(values) == 3 else [(0, 0, np.asarray(values))]
+    for _, _, slab in slabs:
+        slab = np.ravel(slab)
+        binned_values = (slab * bin_count).astype(np.int64)
+        np.clip(binned_values, 0, bin_count - 1, out=binned_values)
+        counts += np.bincount(binned_values, minlength=bin_count)
+
+        slab_values, slab_counts = np.unique(slab, return_counts=True)
+        unique_values, merged = np.unique(np.concatenate((unique_values, slab_values)), return_inverse=True)
+        value_counts = np.bincount(merged.ravel(), np.concatenate((value_counts, slab_counts)), minlength=len(unique_values)).astype(np.int64)
+    bin_edges = np.linspace(0.0, 1.0, bin_count + 1)
+
+    min_value = float(unique_values[0]) if unique_values.size else 0.0
+    max_value = float(unique_values[-1]) if unique_values.size else 0.0
+
+    return Histogram(counts, bin_edges, min_value, max_value, unique_values, value_counts)
+
+
+def calculate_integer_histogram(values, bin_count=100):
+    """
+    Calculate the histogram of the intensities of an unsigned integer volume, scaled to
+    the range [0, 1] by the maximum of its data type as for calculate_histogram.
+
+    Counting every possible integer value is linear in the number of voxels, which is
+    much faster than finding the distinct values of the converted intensities.
+    """
+    scale = np.float32(np.iinfo(values.dtype).max)
+    integer_counts = np.zeros(int(scale) + 1, dtype=np.int64)
+    for _, _, slab in iterate_slabs(values):
+        integer_counts += np.bincount(np.ravel(slab), minlength=len(integer_counts))
+
+    present = np.flatnonzero(integer_counts)
+    unique_values = present.astype(np.float32) / scale
+    value_counts = integer_counts[present]
+    binned_values = (unique_values * bin_count).astype(np.int64)
+    np.clip(binned_values, 0, bin_count - 1, out=binned_values)
+    counts = np.bincount(binned_values, value_counts, minlength=bin_count).astype(np.int64)
+    bin_edges = np.linspace(0.0, 1.0, bin_count + 1)
+
+    min_value = float(unique_values[0]) if unique_values.size else 0.0
+    max_value = float(unique_values[-1]) if unique_values.size else 0.0
+
+    return Histogram(counts, bin_edges, min_value, max_value, unique_values, value_counts)
+
+
+def calculate_volume_histogram(volume):
+    """
+    Calculate the intensity histogram of a source volume, counting the integer values of
+    single channel 8 and 16-bit volumes directly, otherwise converting it to intensity slab by slab.
+    """
+    if get_component_count(volume) == 1 and is_image_data_type(volume.dtype):
+        return calculate_integer_histogram(volume)
+
+    return calculate_histogram(IntensityVolume(volume))
+
+
+def plot_histogram(histogram, axes):
+    """
+    Draw a histogram as filled steps on a set of matplotlib axes.
+    """
+    axes.stairs(histogram.get_counts(), histogram.get_bin_edges(), fill=True)
+    axes.set(title='Frequency Histogram', xlabel='Intensity', ylabel='Frequency')
@@ -0,0 +1,317 @@
+"""
+Created: October, 2026
+
+Read image stacks directly into NumPy voxel arrays.
+"""
+import io
+import os
+import threading
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+
+from PIL import Image, UnidentifiedImageError
+
+# PAL, NTSC scaling.
+LUMINANCE_WEIGHTS = (0.299, 0.587, 0.114)
+# Image decoding is mostly I/O and releases the GIL, more threads than this rarely help.
+MAXIMUM_DECODE_WORKERS = 16
+# Downsampling factors of the multi-resolution pyramid, each a multiple of the previous one.
+PYRAMID_FACTORS = (2, 4, 8)
+# Number of voxels read at a time by the functions that process a volume in slabs.
+SLAB_VOXEL_COUNT = 32 * 1024 ** 2
+# Zinc is not thread safe, images the decoding threads read with Zinc are decoded one at a time.
+_zinc_decode_lock = threading.Lock()
+
+
+def _image_to_pixels(image):
+    if image.mode == '1':
+        image = image.convert('L')
+    elif image.mode in ('P', 'CMYK', 'YCbCr', 'HSV', 'LAB'):
+        image = image.convert('RGB')
+    elif image.mode == 'PA':
+        image = image.convert('RGBA')
+    pixels = np.asarray(image)
+
+    if pixels.dtype.kind == 'i':
+        # Pillow reads 16-bit greyscale images as signed 32-bit integers.
+        pixels = pixels.astype(np.uint16)
+    elif not pixels.dtype.isnative:
+        # Big-endian 16-bit images are read in their file byte order.
+        pixels = pixels.astype(pixels.dtype.newbyteorder('='))
+
+    return pixels
+
+
+def _read_image_with_zinc(image_file):
+    """
+    Decode an image in a format Pillow cannot read, such as DICOM, with Zinc, which re-encodes it as a PNG image in memory.
+
+    Each image is read in its own Zinc context, while holding a lock, so images are decoded by Zinc one at a time
+    when called from the decoding threads of read_image_stack.
+    """
+    from cmlibs.zinc.context import Context
+    from cmlibs.zinc.result import RESULT_OK
+    from cmlibs.zinc.streamimage import StreaminformationImage
+
+    with _zinc_decode_lock:
+        field_module = Context('image-decode').getDefaultRegion().getFieldmodule()
+        image_field = field_module.createFieldImage()
+        stream_information = image_field.createStreaminformationImage()
+        stream_information.createStreamresourceFile(image_file)
+        if image_field.read(stream_information) != RESULT_OK:
+            raise ValueError(f"Could not read image '{image_file}'.")
+
+        stream_information = image_field.createStreaminformationImage()
+        stream_information.setFileFormat(StreaminformationImage.FILE_FORMAT_PNG)
+        memory_resource = stream_information.createStreamresourceMemory()
+        if image_field.write(stream_information) != RESULT_OK:
+            raise ValueError(f"Could not convert image '{image_file}'.")
+
+        result, buffer = memory_resource.getBuffer()
+        if result != RESULT_OK or not buffer:
+            raise ValueError(f"Could not convert image '{image_file}'.")
+
+    with Image.open(io.BytesIO(buffer)) as image:
+        return _image_to_pixels(image)
+
+
+def read_image_slice(image_file):
+    """
+    Decode a single image into a (columns, rows[, components]) array in its native data type.
+
+    Rows are flipped so that index zero is the bottom row of the image, matching
+    the pixel ordering of a Zinc image field. Images are decoded with Pillow, formats it
+    cannot read, such as DICOM, are decoded with Zinc.
+    """
+    try:
+        with Image.open(image_file) as image:
+            pixels = _image_to_pixels(image)
+    except UnidentifiedImageError:
+        pixels = _read_image_with_zinc(image_file)
+
+    return np.swapaxes(pixels[::-1], 0, 1)
+
+
+def encode_image_slice(image_slice):
+    """
+    Encode a (columns, rows[, components]) array of 8-bit, or single component 16-bit, values
+    as a PNG image, reversing read_image_slice.
+    """
+    pixels = np.swapaxes(image_slice, 0, 1)[::-1]
+    image = Image.fromarray(np.ascontiguousarray(pixels, dtype=pixels.dtype.newbyteorder('=')))
+    buffer = io.BytesIO()
+    # The images are only held until Zinc reads them, uncompressed images are the fastest to encode and decode.
+    image.save(buffer, format='PNG', compress_level=0)
+    return buffer.getvalue()
+
+
+def is_image_data_type(dtype):
+    """
+    Check whether a data type is an unsigned 8 or 16-bit integer, in either byte order.
+    """
+    dtype = np.dtype(dtype)
+    return dtype.kind == 'u' and dtype.itemsize <= 2
+
+
+def read_image_stack(image_files, workers=None, progress_callback=None, allocate=None):
+    """
+    Decode a stack of images into a contiguous (x, y, z[, components]) volume.
+
+    Slices after the first are decoded by a pool of worker threads directly into the
+    preallocated volume, a single worker decodes the slices in order. If given, the progress
+    callback is called with the number of decoded slices and the total after each slice, an
+    exception raised by it stops the decoding.
+    The volume is allocated by calling allocate with its shape and data type, by default
+    in memory with numpy.empty, another allocator can return a memory-mapped array.
+    """
+    image_files = list(image_files)
+    slice_count = len(image_files)
+    first_slice = read_image_slice(image_files[0])
+    shape = first_slice.shape[:2] + (slice_count,) + first_slice.shape[2:]
+    volume = (np.empty if allocate is None else allocate)(shape, first_slice.dtype)
+    volume[:, :, 0] = first_slice
+    if progress_callback is not None:
+        progress_callback(1, slice_count)
+
+    def _read_into_volume(index):
+        image_slice = read_image_slice(image_files[index])
+        if image_slice.shape != first_slice.shape or image_slice.dtype != first_slice.dtype:
+            raise ValueError(f"Image '{image_files[index]}' does not match the size or type of the first image in the stack.")
+        volume[:, :, index] = image_slice
+
+    if workers is None:
+        workers = min(os.cpu_count() or 1, MAXIMUM_DECODE_WORKERS)
+
+    completed = 1
+    if workers > 1 and slice_count > 2:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_read_into_volume, index) for index in range(1, slice_count)]
+            try:
+                for future in as_completed(futures):
+                    future.result()
+                    completed += 1
+                    if progress_callback is not None:
+                        progress_callback(completed, slice_count)
+            except BaseException:
+                # Do not wait for the remaining slices when a slice fails or the progress callback raises.
+                for future in futures:
+                    future.cancel()
+                raise
+    else:
+        for index in range(1, slice_count):
+            _read_into_volume(index)
+            completed += 1
+            if progress_callback is not None:
+                progress_callback(completed, slice_count)
+
+    return volume
+
+
+def get_component_count(volume):
+    return volume.shape[3] if volume.ndim == 4 else 1
+
+
+def get_normalisation_scale(dtype):
+    dtype = np.dtype(dtype)
+    if dtype.kind in 'ui':
+        return float(np.iinfo(dtype).max)
+
+    return 1.0
+
+
+def _convert_to_intensity(values, component_count):
+    # Convert source values, with the components along the last axis if there is more than one.
+    scale = np.float32(get_normalisation_scale(values.dtype))
+    if component_count == 1:
+        return values.astype(np.float32) / scale
+
+    if component_count in (3, 4):
+        intensity = values[..., 0] * np.float32(LUMINANCE_WEIGHTS[0])
+        intensity += values[..., 1] * np.float32(LUMINANCE_WEIGHTS[1])
+        intensity += values[..., 2] * np.float32(LUMINANCE_WEIGHTS[2])
+        intensity /= scale
+        return intensity
+
+    return values[..., 0].astype(np.float32) / scale
+
+
+def to_intensity(volume):
+    """
+    Reduce a source volume to a single channel float32 intensity volume with values scaled
+    to the range [0, 1], matching the value image field used by the model.
+    """
+    return _convert_to_intensity(volume, get_component_count(volume))
+
+
+class IntensityVolume(object):
+    """
+    Intensity view of a source volume, usually memory-mapped, converted on access.
+
+    Indexing with slices or index arrays over the (x, y, z) axes returns the float32
+    intensity of the selected voxels, as to_intensity would, reading only those voxels
+    from the source. If an upper value is given, intensities above it read as zero,
+    as in the targeted segmentation mode.
+    """
+
+    def __init__(self, source, upper_value=None):
+        self._source = source
+        self._component_count = get_component_count(source)
+        self._upper_value = upper_value
+        self.shape = source.shape[:3]
+        self.ndim = 3
+        self.dtype = np.dtype(np.float32)
+
+    def get_source(self):
+        return self._source
+
+    def with_upper_value(self, upper_value):
+        return IntensityVolume(self._source, upper_value)
+
+    def __getitem__(self, index):
+        values = _convert_to_intensity(np.asarray(self._source[index]), self._component_count)
+        if self._upper_value is not None:
+            values[values > self._upper_value] = np.float32(0.0)
+
+        return values
+
+    def __array__(self, dtype=None, copy=None):
+        values = self[:, :, :]
+        return values if dtype is None else values.astype(dtype)
+
+
+def get_slab_thickness(shape, multiple=1):
+    """
+    Get the number of z planes read at a time when processing a volume of the given shape in slabs,
+    rounded down to a multiple of the given value.
+    """
+    thickness = max(1, SLAB_VOXEL_COUNT // max(1, shape[0] * shape[1]))
+    return max(multiple, thickness - thickness % multiple)
+
+
+def iterate_slabs(values, thickness=None):
+    """
+    Iterate over an (x, y, z) volume in slabs of z planes, reading one slab at a time.
+
+    :return: Iterator of (z start, z end, slab values).
+    """
+    size = values.shape[2]
+    thickness = get_slab_thickness(values.shape) if thickness is None else thickness
+    for z0 in range(0, size, thickness):
+        z1 = min(z0 + thickness, size)
+        yield z0, z1, np.asarray(values[:, :, z0:z1])
+
+
+def downsample(values, factor):
+    """
+    Downsample an (x, y, z) volume by averaging blocks of factor^3 voxels.
+
+    Volumes that are not a multiple of the factor in size are padded by repeating their
+    upper boundary values.
+    """
+    padding = [(0, -size % factor) for size in values.shape]
+    if any(p[1] for p in padding):
+        values = np.pad(values, padding, mode='edge')
+
+    nx, ny, nz = (size // factor for size in values.shape)
+    blocks = np.asarray(values, dtype=np.float32).reshape(nx, factor, ny, factor, nz, factor)
+    return blocks.mean(axis=(1, 3, 5), dtype=np.float32)
+
+
+def _downsampled_size(size, factor):
+    return -(-size // factor)
+
+
+def build_pyramid(values, factors=PYRAMID_FACTORS):
+    """
+    Build a multi-resolution pyramid of an (x, y, z) volume.
+
+    The volume is read once, in slabs of z planes that are a multiple of the largest factor,
+    so volumes larger than memory can be downsampled when memory-mapped.
+
+    :return: Dictionary of the downsampled volumes by downsampling factor, including the
+        full resolution volume for a factor of one.
+    """
+    factors = sorted(factors)
+    pyramid = {1: values}
+    if not factors:
+        return pyramid
+
+    shapes = {1: values.shape[:3]}
+    previous_factor = 1
+    for factor in factors:
+        shapes[factor] = tuple(_downsampled_size(size, factor // previous_factor) for size in shapes[previous_factor])
+        pyramid[factor] = np.empty(shapes[factor], dtype=np.float32)
+        previous_factor = factor
+
+    for z0, z1, slab in iterate_slabs(values, get_slab_thickness(values.shape, factors[-1])):
+        # Slabs start on a multiple of every factor so downsampling them separately is exact.
+        previous_factor = 1
+        for factor in factors:
+            slab = downsample(slab, factor // previous_factor)
+            start = z0 // factor
+            pyramid[factor][:, :, start:start + slab.shape[2]] = slab
+            previous_factor = factor
+
+    return pyramid
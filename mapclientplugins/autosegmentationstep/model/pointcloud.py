@@ -0,0 +1,27 @@
+"""
+Created: October, 2026
+
+Zinc point clouds from coordinate arrays.
+"""
+import numpy as np
+
+from cmlibs.utils.zinc.finiteelement import get_maximum_node_identifier
+from cmlibs.utils.zinc.general import ChangeManager
+
+
+def create_points(nodeset, coordinate_field, coordinates):
+    """
+    Create a node or datapoint in the nodeset for every row of an (n, 3) coordinates array,
+    in a single change, numbered consecutively after the highest identifier in the nodeset.
+    """
+    field_module = coordinate_field.getFieldmodule()
+    node_identifier = max(get_maximum_node_identifier(nodeset), 0) + 1
+    with ChangeManager(field_module):
+        field_cache = field_module.createFieldcache()
+        node_template = nodeset.createNodetemplate()
+        node_template.defineField(coordinate_field)
+        for point in np.asarray(coordinates, dtype=np.float64).tolist():
+            node = nodeset.createNode(node_identifier, node_template)
+            field_cache.setNode(node)
+            coordinate_field.assignReal(field_cache, point)
+            node_identifier += 1
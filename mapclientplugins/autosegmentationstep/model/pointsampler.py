@@ -0,0 +1,186 @@
+"""
+Created: October, 2026
+
+Random sampling of points over triangle surfaces.
+"""
+import numpy as np
+
+DEFAULT_POINT_SEED = 0
+POINT_SAMPLING_RANDOM = 'random'
+POINT_SAMPLING_POISSON_DISK = 'poisson-disk'
+POINT_SAMPLINGS = (POINT_SAMPLING_RANDOM, POINT_SAMPLING_POISSON_DISK)
+# Candidates sampled per minimum spacing squared of surface area when sampling with a minimum spacing.
+POISSON_DISK_OVERSAMPLING = 10.0
+# Points per minimum spacing squared of surface area left by thinning the candidates.
+POISSON_DISK_PACKING = 0.6
+
+
+def calculate_triangle_areas(vertices, triangles):
+    vertices = np.asarray(vertices, dtype=np.float64)
+    triangles = np.asarray(triangles, dtype=np.int64)
+    if len(triangles) == 0:
+        return np.zeros(0, dtype=np.float64)
+
+    corners = vertices[triangles]
+    return 0.5 * np.linalg.norm(np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0]), axis=1)
+
+
+def get_sample_count(total_area, point_count=None, point_density=None):
+    """
+    Get the number of points to sample, the point count if given, otherwise the point density per unit area times the area.
+    """
+    if point_count is not None:
+        return max(0, int(point_count))
+    if point_density is None:
+        raise ValueError("Either a point count or a point density is required.")
+
+    return max(0, int(round(total_area * point_density)))
+
+
+def get_poisson_disk_spacing(total_area, point_count=None, point_density=None):
+    """
+    Get the minimum spacing giving approximately the point count, or point density per unit area, when sampling with a minimum spacing.
+    """
+    count = get_sample_count(total_area, point_count, point_density)
+    if count == 0 or total_area <= 0.0:
+        return None
+
+    return float(np.sqrt(POISSON_DISK_PACKING * total_area / count))
+
+
+def sample_surface_points(vertices, triangles, point_count=None, point_density=None, seed=DEFAULT_POINT_SEED):
+    """
+    Sample points uniformly over the area of a triangle surface.
+
+    Triangles are chosen with probability proportional to their area and points placed
+    uniformly within them, so the run time is linear in the number of triangles and points.
+    The same seed always gives the same points for the same surface.
+
+    :param point_count: Number of points to sample, overrides point_density.
+    :param point_density: Number of points per unit area.
+    :param seed: Seed of the random number generator, None for a different sample each time.
+    :return: (n, 3) float64 array of point coordinates.
+    """
+    vertices = np.asarray(vertices, dtype=np.float64)
+    triangles = np.asarray(triangles, dtype=np.int64)
+    areas = calculate_triangle_areas(vertices, triangles)
+    total_area = float(areas.sum())
+    count = get_sample_count(total_area, point_count, point_density)
+    if count == 0 or total_area <= 0.0:
+        return np.zeros((0, 3), dtype=np.float64)
+
+    generator = np.random.default_rng(seed)
+    cumulative_areas = np.cumsum(areas)
+    chosen = np.searchsorted(cumulative_areas, generator.random(count) * cumulative_areas[-1], side='right')
+    chosen = np.minimum(chosen, len(triangles) - 1)
+
+    # Uniform barycentric coordinates by reflecting points outside the triangle back into it.
+    u, v = generator.random((2, count))
+    outside = u + v > 1.0
+    u[outside] = 1.0 - u[outside]
+    v[outside] = 1.0 - v[outside]
+
+    corners = vertices[triangles[chosen]]
+    return corners[:, 0] + u[:, None] * (corners[:, 1] - corners[:, 0]) + v[:, None] * (corners[:, 2] - corners[:, 0])
+
+
+def _find_neighbour_cells(cell_keys, offset_keys):
+    """
+    Find the occupied neighbours of every occupied cell of a spatial hash grid.
+
+    :param cell_keys: Sorted keys of the occupied cells.
+    :param offset_keys: Key offsets of the neighbours of a cell.
+    :return: Offsets into and indexes of the neighbouring cells, in compressed sparse row layout.
+    """
+    cells = []
+    neighbours = []
+    for offset_key in offset_keys.tolist():
+        # Shifted keys are sorted, which keeps the search fast.
+        neighbour_keys = cell_keys + offset_key
+        neighbour_cells = np.minimum(np.searchsorted(cell_keys, neighbour_keys), len(cell_keys) - 1)
+        occupied = np.nonzero(cell_keys[neighbour_cells] == neighbour_keys)[0]
+        cells.append(occupied.astype(np.int32))
+        neighbours.append(neighbour_cells[occupied].astype(np.int32))
+
+    cells = np.concatenate(cells)
+    order = np.argsort(cells, kind='stable')
+    offsets = np.zeros(len(cell_keys) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(cells, minlength=len(cell_keys)), out=offsets[1:])
+    return offsets, np.concatenate(neighbours)[order]
+
+
+def sample_poisson_disk_points(vertices, triangles, minimum_spacing, seed=DEFAULT_POINT_SEED, oversampling=POISSON_DISK_OVERSAMPLING):
+    """
+    Sample points over a triangle surface no closer than the minimum spacing to each other.
+
+    Random candidate points are thinned in random order, keeping each candidate further than the
+    minimum spacing from every point kept before it. Candidates are binned in a spatial hash grid
+    with cells small enough to hold at most one kept point, and cells far enough apart to not
+    interact are processed together, so every step is vectorised over many candidates.
+
+    :param oversampling: Number of candidates per minimum_spacing squared of surface area.
+    :return: (n, 3) float64 array of point coordinates.
+    """
+    areas = calculate_triangle_areas(vertices, triangles)
+    candidate_count = int(round(float(areas.sum()) * oversampling / minimum_spacing ** 2))
+    candidates = sample_surface_points(vertices, triangles, point_count=candidate_count, seed=seed)
+    if len(candidates) == 0:
+        return candidates
+
+    # The diagonal of a cell is the minimum spacing.
+    cell_size = minimum_spacing / np.sqrt(3.0)
+    cells = np.floor((candidates - candidates.min(axis=0)) / cell_size).astype(np.int64) + 2
+    extent = cells.max(axis=0) + 3
+    strides = np.array([extent[1] * extent[2], extent[2], 1], dtype=np.int64)
+    cell_keys, candidate_cells = np.unique(cells @ strides, return_inverse=True)
+    candidate_cells = candidate_cells.ravel()
+    # Neighbouring cells which can hold a point within the minimum spacing of a point in the cell.
+    offsets = np.array([o for o in np.ndindex(5, 5, 5) if np.sum(np.maximum(np.abs(np.array(o) - 2) - 1, 0) ** 2) < 3]) - 2
+    neighbour_offsets, neighbour_cells = _find_neighbour_cells(cell_keys, offsets @ strides)
+    phases = (cells % 3) @ np.array([9, 3, 1], dtype=np.int64)
+
+    # Candidates are already in random order, the kept point of each cell is recorded by candidate index.
+    kept = np.full(len(cell_keys), -1, dtype=np.int64)
+    untested = np.ones(len(candidates), dtype=bool)
+    minimum_spacing_squared = minimum_spacing ** 2
+    # Group the candidates by phase, keeping their random order within each phase.
+    remaining = np.argsort(phases, kind='stable')
+    while len(remaining):
+        phase_starts = np.searchsorted(phases[remaining], np.arange(28))
+        for phase in range(27):
+            in_phase = remaining[phase_starts[phase]:phase_starts[phase + 1]]
+            if len(in_phase) == 0:
+                continue
+
+            # Test the first candidate of each cell in the phase, cells in a phase are at least two cells apart.
+            tested_cells, first = np.unique(candidate_cells[in_phase], return_index=True)
+            tested = in_phase[first]
+            counts = neighbour_offsets[tested_cells + 1] - neighbour_offsets[tested_cells]
+            owners = np.repeat(np.arange(len(tested)), counts)
+            positions = np.arange(len(owners)) - np.repeat(np.cumsum(counts) - counts, counts) + neighbour_offsets[tested_cells][owners]
+            neighbours = kept[neighbour_cells[positions]]
+            occupied = neighbours >= 0
+            owners = owners[occupied]
+            distances = np.sum((candidates[neighbours[occupied]] - candidates[tested[owners]]) ** 2, axis=1)
+            rejected = np.zeros(len(tested), dtype=bool)
+            rejected[owners[distances < minimum_spacing_squared]] = True
+            accepted = tested[~rejected]
+            kept[candidate_cells[accepted]] = accepted
+            untested[tested] = False
+
+        # Cells holding a kept point cannot hold another.
+        remaining = remaining[untested[remaining] & (kept[candidate_cells[remaining]] < 0)]
+
+    return candidates[np.sort(kept[kept >= 0])]
+
+
+def sample_even_surface_points(vertices, triangles, point_count=None, point_density=None, seed=DEFAULT_POINT_SEED):
+    """
+    Sample approximately the point count, or point density per unit area, over a triangle surface with
+    the minimum spacing that number of points allows.
+    """
+    spacing = get_poisson_disk_spacing(float(calculate_triangle_areas(vertices, triangles).sum()), point_count, point_density)
+    if spacing is None:
+        return np.zeros((0, 3), dtype=np.float64)
+
+    return sample_poisson_disk_points(vertices, triangles, spacing, seed)
@@ -0,0 +1,87 @@
+"""
+Created: October, 2026
+
+Speculative loading of an image stack into the volume cache before the step is shown.
+"""
+import threading
+import traceback
+
+from mapclientplugins.autosegmentationstep.model.autosegmentationmodel import (
+    LoadCancelled, generate_input_hash, get_histogram_key, get_pyramid_factors, load_cached_pyramid, load_source_volume,
+    store_cached_pyramid)
+from mapclientplugins.autosegmentationstep.model.histogram import calculate_volume_histogram
+from mapclientplugins.autosegmentationstep.model.imagevolume import IntensityVolume, build_pyramid
+from mapclientplugins.autosegmentationstep.model.volumecache import VolumeCache, generate_volume_key
+from mapclientplugins.autosegmentationstep.tracing import traced
+
+
+@traced('prefetch volume')
+def prefetch_volume(image_files, cache_location, is_cancelled=None):
+    """
+    Decode an image stack into the volume cache and add the histogram and image pyramid of the
+    whole image, so the model loads them from the cache. Only NumPy is used, no Zinc objects are created.
+
+    :param is_cancelled: Function returning True to stop prefetching with LoadCancelled.
+    """
+    def _check_cancelled(*_):
+        if is_cancelled is not None and is_cancelled():
+            raise LoadCancelled()
+
+    volume_cache = VolumeCache(cache_location)
+    volume_key = generate_volume_key(image_files)
+    volume = load_source_volume(image_files, volume_cache, volume_key, _check_cancelled)
+    dimensions = list(volume.shape[:3])
+    input_hash = generate_input_hash(volume_key, [[0, d] for d in dimensions])
+
+    _check_cancelled()
+    histogram_key = get_histogram_key(input_hash)
+    if volume_cache.load_arrays(histogram_key) is None:
+        volume_cache.store_arrays(histogram_key, calculate_volume_histogram(volume).get_arrays())
+
+    _check_cancelled()
+    # The intensity is converted slab by slab, as for a volume processed out of core.
+    values = IntensityVolume(volume)
+    factors = get_pyramid_factors(dimensions)
+    if load_cached_pyramid(volume_cache, input_hash, values, factors) is None:
+        store_cached_pyramid(volume_cache, input_hash, build_pyramid(values, factors))
+
+
+class VolumePrefetch(object):
+    """
+    Prefetch an image stack into the volume cache on a background thread.
+
+    Errors are kept rather than raised, loading the model afterwards repeats any work not done.
+    """
+
+    def __init__(self, image_files, cache_location):
+        self._image_files = list(image_files)
+        self._cache_location = cache_location
+        self._cancelled = threading.Event()
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name='auto-segmentation-prefetch', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def wait(self, timeout=None):
+        """
+        Wait for prefetching to finish, up to the timeout in seconds.
+
+        :return: True if prefetching has finished.
+        """
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
+
+    def get_error(self):
+        return self._error
+
+    def _run(self):
+        try:
+            prefetch_volume(self._image_files, self._cache_location, self._cancelled.is_set)
+        except LoadCancelled:
+            pass
+        except Exception:
+            self._error = traceback.format_exc()
@@ -0,0 +1,73 @@
+"""
+Created: October, 2026
+
+In-memory cache of extracted segmentation surfaces and the data derived from them.
+"""
+import threading
+
+from collections import OrderedDict
+
+DEFAULT_SURFACE_CACHE_SIZE = 512 * 1024 ** 2
+
+
+class SurfaceCache(object):
+    """
+    Size bounded, least recently used cache of surfaces and derived arrays.
+
+    Keys are tuples identifying everything the value depends on, values are stored with
+    their size in bytes. The cache may be used from worker threads.
+    """
+
+    def __init__(self, max_size=DEFAULT_SURFACE_CACHE_SIZE):
+        self._max_size = max_size
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get_max_size(self):
+        return self._max_size
+
+    def set_max_size(self, max_size):
+        with self._lock:
+            self._max_size = max_size
+            self._evict()
+
+    def get_size(self):
+        return self._size
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, value, size):
+        """
+        Store a value, evicting the least recently used values to stay within the maximum size.
+        Values larger than the maximum size are not stored.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._size -= self._entries.pop(key)[1]
+            if size > self._max_size:
+                return
+
+            self._entries[key] = (value, size)
+            self._size += size
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def _evict(self):
+        while self._size > self._max_size and self._entries:
+            _, (_, size) = self._entries.popitem(last=False)
+            self._size -= size
@@ -0,0 +1,169 @@
+"""
+Created: October, 2026
+
+Automatic segmentation threshold suggestions from an intensity histogram.
+"""
+import numpy as np
+
+THRESHOLD_METHOD_OTSU = 'otsu'
+THRESHOLD_METHOD_MULTI_OTSU = 'multi-otsu'
+THRESHOLD_METHOD_PERCENTILE = 'percentile'
+DEFAULT_CLASS_COUNT = 3
+DEFAULT_PERCENTILES = (50.0, 90.0, 99.0)
+# Multi-level Otsu searches every combination of thresholds, so it uses a coarser histogram.
+MULTI_OTSU_BIN_COUNT = 256
+
+
+class ThresholdSuggestion(object):
+
+    def __init__(self, method, value, description):
+        self._method = method
+        self._value = value
+        self._description = description
+
+    def get_method(self):
+        return self._method
+
+    def get_value(self):
+        return self._value
+
+    def get_description(self):
+        return self._description
+
+
+def _class_statistics(values, counts):
+    weights = np.cumsum(counts, dtype=np.float64)
+    moments = np.cumsum(values * counts, dtype=np.float64)
+    return weights, moments
+
+
+def otsu_threshold(values, counts):
+    """
+    Get the threshold maximising the between class variance of the values at or below it
+    and the values above it, from the distinct values of an image and their counts.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    counts = np.asarray(counts, dtype=np.float64)
+    if len(values) < 2:
+        return float(values[0]) if len(values) else 0.0
+
+    weights, moments = _class_statistics(values, counts)
+    total_weight = weights[-1]
+    total_moment = moments[-1]
+    lower_weights = weights[:-1]
+    upper_weights = total_weight - lower_weights
+    lower_means = moments[:-1] / lower_weights
+    upper_means = (total_moment - moments[:-1]) / upper_weights
+    variances = lower_weights * upper_weights * (lower_means - upper_means) ** 2
+
+    return float(values[np.argmax(variances)])
+
+
+def multi_otsu_thresholds(values, counts, class_count=DEFAULT_CLASS_COUNT, bin_count=MULTI_OTSU_BIN_COUNT):
+    """
+    Get the class_count - 1 thresholds maximising the between class variance of class_count
+    classes of values, from the distinct values of an image and their counts.
+
+    Values are first binned into bin_count bins over their range, the thresholds are the
+    upper edges of the bins ending each class but the last.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    counts = np.asarray(counts, dtype=np.float64)
+    if len(values) < class_count:
+        return [float(v) for v in values[:-1]]
+
+    low, high = values[0], values[-1]
+    bins = np.minimum(((values - low) / (high - low) * bin_count).astype(np.int64), bin_count - 1)
+    bin_counts = np.bincount(bins, counts, minlength=bin_count)
+    bin_moments = np.bincount(bins, values * counts, minlength=bin_count)
+    weights = np.concatenate(([0.0], np.cumsum(bin_counts)))
+    moments = np.concatenate(([0.0], np.cumsum(bin_moments)))
+
+    # Maximising the between class variance is maximising the sum of weight * mean^2 over the classes.
+    # scores[start, end] is the score of a class covering bins [start, end).
+    class_weights = weights[None, :] - weights[:, None]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scores = np.where(class_weights > 0.0, (moments[None, :] - moments[:, None]) ** 2 / class_weights, 0.0)
+    starts, ends = np.indices(scores.shape)
+    scores[(starts == 0) | (starts >= ends)] = -np.inf
+
+    # best[end] is the best score of the classes so far covering bins [0, end), choices record the start of the last class.
+    best = (moments[1:] ** 2 / np.where(weights[1:] > 0.0, weights[1:], 1.0))
+    best = np.concatenate(([0.0], best))
+    choices = []
+    for _ in range(class_count - 1):
+        totals = best[:, None] + scores
+        choices.append(np.argmax(totals, axis=0))
+        best = totals.max(axis=0)
+
+    starts = []
+    end = bin_count
+    for choice in reversed(choices):
+        end = choice[end]
+        starts.append(end)
+
+    edges = np.linspace(low, high, bin_count + 1)
+    return [float(edges[start]) for start in sorted(starts)]
+
+
+def percentile_threshold(values, counts, percentile):
+    """
+    Get the smallest value with at least the given percentage of the counts at or below it.
+    """
+    cumulative = np.cumsum(counts, dtype=np.float64)
+    if len(cumulative) == 0:
+        return 0.0
+
+    index = np.searchsorted(cumulative, cumulative[-1] * percentile / 100.0)
+    return float(values[min(index, len(values) - 1)])
+
+
+def suggest_thresholds(histogram, class_count=DEFAULT_CLASS_COUNT, percentiles=DEFAULT_PERCENTILES):
+    """
+    Suggest segmentation thresholds for the intensity histogram of an image.
+
+    :return: List of ThresholdSuggestion, Otsu first, then multi-level Otsu and percentiles.
+    """
+    values = histogram.get_values()
+    counts = histogram.get_value_counts()
+    suggestions = [ThresholdSuggestion(THRESHOLD_METHOD_OTSU, otsu_threshold(values, counts), "Otsu")]
+    for index, value in enumerate(multi_otsu_thresholds(values, counts, class_count)):
+        suggestions.append(ThresholdSuggestion(THRESHOLD_METHOD_MULTI_OTSU, value, f"Multi-Otsu {index + 1} of {class_count - 1}"))
+    for percentile in percentiles:
+        suggestions.append(ThresholdSuggestion(THRESHOLD_METHOD_PERCENTILE, percentile_threshold(values, counts, percentile), f"{percentile:g}th percentile"))
+
+    return suggestions
+
+
+def calculate_threshold(histogram, method, parameter=None):
+    """
+    Calculate a single threshold by the given method. The parameter is the percentile for
+    THRESHOLD_METHOD_PERCENTILE and the one based index of the threshold between DEFAULT_CLASS_COUNT
+    classes for THRESHOLD_METHOD_MULTI_OTSU, the first by default.
+    """
+    values = histogram.get_values()
+    counts = histogram.get_value_counts()
+    if method == THRESHOLD_METHOD_OTSU:
+        return otsu_threshold(values, counts)
+    if method == THRESHOLD_METHOD_MULTI_OTSU:
+        thresholds = multi_otsu_thresholds(values, counts)
+        index = 1 if parameter is None else int(parameter)
+        return thresholds[min(max(index, 1), len(thresholds)) - 1] if thresholds else otsu_threshold(values, counts)
+    if method == THRESHOLD_METHOD_PERCENTILE:
+        return percentile_threshold(values, counts, DEFAULT_PERCENTILES[0] if parameter is None else float(parameter))
+
+    raise ValueError(f"Unknown threshold method '{method}'.")
+
+
+def parse_threshold_method(text):
+    """
+    Parse a threshold method given as METHOD or METHOD:PARAMETER, for example otsu,
+    multi-otsu:2 or percentile:90.
+
+    :return: Method and parameter, None if not given.
+    """
+    method, _, parameter = text.strip().partition(':')
+    if method not in (THRESHOLD_METHOD_OTSU, THRESHOLD_METHOD_MULTI_OTSU, THRESHOLD_METHOD_PERCENTILE):
+        raise ValueError(f"Unknown threshold method '{method}'.")
+
+    return method, parameter or None
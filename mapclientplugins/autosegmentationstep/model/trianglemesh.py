@@ -0,0 +1,228 @@
+"""
+Created: October, 2026
+
+Create Zinc triangle meshes directly from vertex and triangle arrays.
+"""
+import itertools
+import re
+
+import numpy as np
+
+from cmlibs.utils.zinc.finiteelement import get_maximum_node_identifier
+from cmlibs.utils.zinc.general import ChangeManager
+from cmlibs.zinc.element import Element, Elementbasis
+from cmlibs.zinc.field import Field
+
+DEFAULT_RELATIVE_WELD_TOLERANCE = 1e-6
+
+_STL_VERTEX_PATTERN = re.compile(rb'vertex\s+([^\r\n]+)')
+
+
+def read_ascii_stl(buffer):
+    """
+    Read the triangles of an ASCII STL buffer, Zinc does not write binary STL.
+    The coordinates of every vertex line are joined and parsed by NumPy in one call.
+
+    :return: Vertex coordinates and triangle vertex indices, three unshared vertices per triangle.
+    """
+    coordinates = b' '.join(_STL_VERTEX_PATTERN.findall(buffer))
+    vertices = np.fromstring(coordinates, dtype=np.float64, sep=' ').reshape(-1, 3)
+    return vertices, np.arange(len(vertices)).reshape(-1, 3)
+
+
+def _hash_cells(keys):
+    # Number the distinct integer cell keys, using a single integer key per cell when it fits.
+    extents = keys.max(axis=0) + 1
+    if np.prod(extents.astype(np.float64)) < 2.0 ** 62:
+        _, cells = np.unique(np.ravel_multi_index(keys.T, extents), return_inverse=True)
+    else:
+        _, cells = np.unique(keys, axis=0, return_inverse=True)
+
+    return cells.ravel()
+
+
+def _merge_labels(labels, cells):
+    # Give every point in a cell the lowest label of the points in that cell.
+    cell_labels = np.full(cells.max() + 1, len(labels), dtype=labels.dtype)
+    np.minimum.at(cell_labels, cells, labels)
+    return cell_labels[cells]
+
+
+def weld_vertices(vertices, triangles, tolerance=None):
+    """
+    Merge coincident vertices of a triangle mesh using a spatial hash.
+
+    Vertices are hashed into cells the size of the tolerance on grids offset by half a cell
+    along each axis, vertices sharing a cell on any grid are merged. Vertices closer than half
+    the tolerance along every axis are always merged. Triangles that become degenerate are
+    removed. The default tolerance is a millionth of the bounding box diagonal.
+
+    :return: Welded vertex coordinates and triangle vertex indices.
+    """
+    vertices = np.asarray(vertices, dtype=np.float64).reshape(-1, 3)
+    triangles = np.asarray(triangles, dtype=np.int64).reshape(-1, 3)
+    if len(vertices) == 0:
+        return vertices, triangles
+
+    if tolerance is None:
+        tolerance = DEFAULT_RELATIVE_WELD_TOLERANCE * np.linalg.norm(np.ptp(vertices, axis=0))
+    if tolerance > 0.0:
+        scaled = (vertices - vertices.min(axis=0)) / tolerance
+        grid_cells = []
+        for offset in itertools.product((0.0, 0.5), repeat=3):
+            grid_cells.append(_hash_cells(np.floor(scaled + offset).astype(np.int64)))
+    else:
+        _, cells = np.unique(vertices, axis=0, return_inverse=True)
+        grid_cells = [cells.ravel()]
+
+    labels = np.arange(len(vertices))
+    changed = True
+    while changed:
+        previous_labels = labels
+        for cells in grid_cells:
+            labels = _merge_labels(labels, cells)
+        changed = not np.array_equal(labels, previous_labels)
+
+    representatives, vertex_map = np.unique(labels, return_inverse=True)
+    triangles = vertex_map.ravel()[triangles]
+    degenerate = (triangles[:, 0] == triangles[:, 1]) | (triangles[:, 1] == triangles[:, 2]) | (triangles[:, 2] == triangles[:, 0])
+
+    return vertices[representatives], triangles[~degenerate]
+
+
+def label_connected_triangles(triangles):
+    """
+    Label the connected components of a triangle mesh, triangles sharing a vertex are connected.
+
+    Uses a vectorised union-find over the triangle edges with pointer jumping.
+
+    :return: Component label for every triangle, components are numbered in order of
+        decreasing size, and the number of components.
+    """
+    triangles = np.asarray(triangles, dtype=np.int64).reshape(-1, 3)
+    if len(triangles) == 0:
+        return np.empty(0, dtype=np.int64), 0
+
+    parent = np.arange(triangles.max() + 1)
+    u = np.concatenate((triangles[:, 0], triangles[:, 1]))
+    v = np.concatenate((triangles[:, 1], triangles[:, 2]))
+    while True:
+        root_u = parent[u]
+        root_v = parent[v]
+        linked = root_u != root_v
+        if not linked.any():
+            break
+        # Hook the larger root onto the smaller one, then compress paths.
+        np.minimum.at(parent, np.maximum(root_u[linked], root_v[linked]), np.minimum(root_u[linked], root_v[linked]))
+        while True:
+            grandparent = parent[parent]
+            if np.array_equal(grandparent, parent):
+                break
+            parent = grandparent
+
+    _, components, sizes = np.unique(parent[triangles[:, 0]], return_inverse=True, return_counts=True)
+    rank = np.empty(len(sizes), dtype=np.int64)
+    rank[np.argsort(-sizes, kind='stable')] = np.arange(len(sizes))
+
+    return rank[components.ravel()], len(sizes)
+
+
+def _create_triangle_templates(coordinate_field, label_field=None):
+    field_module = coordinate_field.getFieldmodule()
+    nodes = field_module.findNodesetByFieldDomainType(Field.DOMAIN_TYPE_NODES)
+    node_template = nodes.createNodetemplate()
+    node_template.defineField(coordinate_field)
+    if label_field is not None:
+        node_template.defineField(label_field)
+
+    mesh = field_module.findMeshByDimension(2)
+    element_template = mesh.createElementtemplate()
+    element_template.setElementShapeType(Element.SHAPE_TYPE_TRIANGLE)
+    basis = field_module.createElementbasis(2, Elementbasis.FUNCTION_TYPE_LINEAR_SIMPLEX)
+    element_field_template = mesh.createElementfieldtemplate(basis)
+    element_template.defineField(coordinate_field, -1, element_field_template)
+    if label_field is not None:
+        element_template.defineField(label_field, -1, element_field_template)
+
+    return nodes, node_template, mesh, element_template, element_field_template
+
+
+def create_triangle_mesh(coordinate_field, vertices, triangles, label_field=None, vertex_labels=None):
+    """
+    Create a node for every vertex and a linear triangle element for every triangle
+    in the region of the given coordinate field.
+
+    If a scalar finite element label field is given, it is also defined over the mesh with the
+    vertex labels at the nodes, so the elements of a label can be selected with a conditional field.
+
+    :return: The identifiers of the created nodes, one per vertex, and of the created elements, one per triangle.
+    """
+    field_module = coordinate_field.getFieldmodule()
+    with ChangeManager(field_module):
+        field_cache = field_module.createFieldcache()
+        nodes, node_template, mesh, element_template, element_field_template = _create_triangle_templates(coordinate_field, label_field)
+        labels = None if label_field is None else np.asarray(vertex_labels, dtype=np.float64).tolist()
+
+        node_identifiers = np.empty(len(vertices), dtype=np.int64)
+        for index, vertex in enumerate(np.asarray(vertices, dtype=np.float64).tolist()):
+            node = nodes.createNode(-1, node_template)
+            field_cache.setNode(node)
+            coordinate_field.assignReal(field_cache, vertex)
+            if labels is not None:
+                label_field.assignReal(field_cache, labels[index])
+            node_identifiers[index] = node.getIdentifier()
+
+        element_identifiers = np.empty(len(triangles), dtype=np.int64)
+        for index, triangle in enumerate(node_identifiers[np.asarray(triangles, dtype=np.int64)].tolist()):
+            element = mesh.createElement(-1, element_template)
+            element.setNodesByIdentifier(element_field_template, triangle)
+            element_identifiers[index] = element.getIdentifier()
+
+    return node_identifiers, element_identifiers
+
+
+class TriangleMeshWriter(object):
+    """
+    Create a triangle mesh in the region of the given coordinate field in parts, such as the
+    slabs of a surface extracted by iterate_isosurface, without holding the whole surface.
+
+    The triangles of each part may index the vertices of any part written before it. Nodes
+    are numbered in vertex order after the highest node identifier already in the region.
+    """
+
+    def __init__(self, coordinate_field):
+        self._coordinate_field = coordinate_field
+        self._field_module = coordinate_field.getFieldmodule()
+        self._nodes, self._node_template, self._mesh, self._element_template, self._element_field_template = _create_triangle_templates(coordinate_field)
+        self._first_node_identifier = max(get_maximum_node_identifier(self._nodes), 0) + 1
+        self._vertex_count = 0
+        self._triangle_count = 0
+
+    def get_vertex_count(self):
+        return self._vertex_count
+
+    def get_triangle_count(self):
+        return self._triangle_count
+
+    def write(self, vertices, triangles):
+        with ChangeManager(self._field_module):
+            field_cache = self._field_module.createFieldcache()
+            node_identifier = self._first_node_identifier + self._vertex_count
+            for vertex in np.asarray(vertices, dtype=np.float64).tolist():
+                node = self._nodes.createNode(node_identifier, self._node_template)
+                field_cache.setNode(node)
+                self._coordinate_field.assignReal(field_cache, vertex)
+                node_identifier += 1
+
+            for triangle in (np.asarray(triangles, dtype=np.int64) + self._first_node_identifier).tolist():
+                element = self._mesh.createElement(-1, self._element_template)
+                element.setNodesByIdentifier(self._element_field_template, triangle)
+
+        self._vertex_count += len(vertices)
+        self._triangle_count += len(triangles)
+
+
+def clear_mesh(field_module):
+    with ChangeManager(field_module):
+        field_module.findMeshByDimension(2).destroyAllElements()
+        field_module.findNodesetByFieldDomainType(Field.DOMAIN_TYPE_NODES).destroyAllNodes()
@@ -0,0 +1,200 @@
+"""
+Created: October, 2026
+
+On-disk cache of decoded image volumes.
+"""
+import os
+import json
+import hashlib
+import tempfile
+
+import numpy as np
+
+VOLUME_CACHE_DIRECTORY = 'volume-cache'
+DEFAULT_CACHE_SIZE = 4 * 1024 ** 3
+CACHE_FILE_EXTENSION = '.npy'
+CACHE_ARRAYS_EXTENSION = '.npz'
+
+
+def generate_volume_key(image_files):
+    """
+    Generate a key identifying the content of an image stack from the path,
+    size and modification time of each image file.
+    """
+    description = []
+    for image_file in image_files:
+        status = os.stat(image_file)
+        description.append([os.path.abspath(image_file), status.st_size, status.st_mtime_ns])
+
+    return hashlib.md5(json.dumps(description).encode('utf-8')).hexdigest()
+
+
+class VolumeCache(object):
+    """
+    Size bounded, least recently used cache of decoded image volumes.
+
+    Volumes are stored as NumPy files so they can be memory-mapped when loaded. Pinned volumes,
+    such as the volume being segmented, are never evicted by this cache object and do not count
+    towards its size.
+    """
+
+    def __init__(self, location, max_size=DEFAULT_CACHE_SIZE):
+        self._location = location
+        self._max_size = max_size
+        self._pinned = set()
+
+    def get_location(self):
+        return self._location
+
+    def get_max_size(self):
+        return self._max_size
+
+    def set_max_size(self, max_size):
+        self._max_size = max_size
+        self._evict()
+
+    def pin(self, key):
+        """
+        Keep the volume with the given key in the cache, while it is backing a memory-mapped volume in use.
+        """
+        self._pinned.add(key)
+
+    def unpin(self, key):
+        self._pinned.discard(key)
+
+    def _cache_file(self, key):
+        return os.path.join(self._location, f"{key}{CACHE_FILE_EXTENSION}")
+
+    def _arrays_file(self, key):
+        return os.path.join(self._location, f"{key}{CACHE_ARRAYS_EXTENSION}")
+
+    def _cache_files(self):
+        if not os.path.isdir(self._location):
+            return []
+
+        return [os.path.join(self._location, f) for f in os.listdir(self._location) if f.endswith((CACHE_FILE_EXTENSION, CACHE_ARRAYS_EXTENSION))]
+
+    def contains(self, key):
+        return os.path.isfile(self._cache_file(key))
+
+    def load(self, key):
+        cache_file = self._cache_file(key)
+        try:
+            volume = np.load(cache_file, mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+
+        # Record the access for least recently used eviction.
+        os.utime(cache_file)
+        return volume
+
+    def store(self, key, volume):
+        if volume.nbytes > self._max_size:
+            return False
+
+        if not os.path.exists(self._location):
+            os.makedirs(self._location)
+
+        handle, temporary_file = tempfile.mkstemp(suffix='.tmp', dir=self._location)
+        try:
+            with os.fdopen(handle, 'wb') as f:
+                np.save(f, np.ascontiguousarray(volume))
+            os.replace(temporary_file, self._cache_file(key))
+        except OSError:
+            if os.path.exists(temporary_file):
+                os.remove(temporary_file)
+            return False
+
+        self._evict(keep=key)
+        return True
+
+    def load_arrays(self, key):
+        """
+        Load a dictionary of arrays derived from a volume, such as its histogram.
+        """
+        cache_file = self._arrays_file(key)
+        try:
+            with np.load(cache_file) as data:
+                arrays = {name: data[name] for name in data.files}
+        except (OSError, ValueError):
+            return None
+
+        os.utime(cache_file)
+        return arrays
+
+    def store_arrays(self, key, arrays):
+        if not os.path.exists(self._location):
+            os.makedirs(self._location)
+
+        handle, temporary_file = tempfile.mkstemp(suffix='.tmp', dir=self._location)
+        try:
+            with os.fdopen(handle, 'wb') as f:
+                np.savez(f, **arrays)
+            os.replace(temporary_file, self._arrays_file(key))
+        except OSError:
+            if os.path.exists(temporary_file):
+                os.remove(temporary_file)
+            return False
+
+        self._evict(keep=key)
+        return True
+
+    def allocate(self, shape, dtype):
+        """
+        Create a memory-mapped volume in a temporary file in the cache, for decoding
+        volumes larger than memory. The volume is added to the cache with commit.
+        """
+        if not os.path.exists(self._location):
+            os.makedirs(self._location)
+
+        handle, temporary_file = tempfile.mkstemp(suffix='.tmp', dir=self._location)
+        os.close(handle)
+        return np.lib.format.open_memmap(temporary_file, mode='w+', dtype=dtype, shape=shape)
+
+    def commit(self, key, temporary_file):
+        """
+        Add a volume allocated by allocate to the cache, once the memory map to it has been closed.
+
+        :return: The cached volume memory-mapped read only, or None if it could not be added.
+        """
+        try:
+            os.replace(temporary_file, self._cache_file(key))
+        except OSError:
+            self.discard(temporary_file)
+            return None
+
+        self._evict(keep=key)
+        return self.load(key)
+
+    def discard(self, temporary_file):
+        if os.path.exists(temporary_file):
+            os.remove(temporary_file)
+
+    def remove(self, key):
+        cache_file = self._cache_file(key)
+        if os.path.isfile(cache_file):
+            os.remove(cache_file)
+
+    def clear(self):
+        for cache_file in self._cache_files():
+            os.remove(cache_file)
+
+    def get_size(self):
+        return sum(os.path.getsize(f) for f in self._cache_files())
+
+    def _evict(self, keep=None):
+        # Evict the least recently used entries, other than the pinned volumes and the entries of the key to keep.
+        pinned_files = {self._cache_file(key) for key in self._pinned}
+        keep_files = set() if keep is None else {self._cache_file(keep), self._arrays_file(keep)}
+        entries = sorted((os.path.getmtime(f), os.path.getsize(f), f) for f in self._cache_files() if f not in pinned_files)
+        total_size = sum(entry[1] for entry in entries)
+        for _, size, cache_file in entries:
+            if total_size <= self._max_size:
+                break
+            if cache_file in keep_files:
+                continue
+            try:
+                os.remove(cache_file)
+            except OSError:
+                continue
+            total_size -= size
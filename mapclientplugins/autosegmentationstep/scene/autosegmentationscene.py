@@ -8,14 +8,49 @@ from cmlibs.zinc.field import Field
 from cmlibs.zinc.glyph import Glyph
 from cmlibs.zinc.material import Material
 
+from mapclientplugins.autosegmentationstep.model.autosegmentationmodel import ISOSURFACE_ENGINE_NUMPY, SEGMENTATION_CONTOUR_GRAPHICS_NAME
+from mapclientplugins.autosegmentationstep.tracing import traced
+
+SEGMENTATION_VALUE_SCALE = 10000.0
+
+
+def get_segmentation_value(slider_value):
+    return slider_value / SEGMENTATION_VALUE_SCALE
+
+
+def get_slider_value(segmentation_value):
+    return int(round(segmentation_value * SEGMENTATION_VALUE_SCALE))
+
+
+def parse_region_of_interest(text):
+    """
+    Parse a region of interest given as "x0, y0, z0, x1, y1, z1" pixels into the
+    [[x0, x1], [y0, y1], [z0, z1]] form used by the model, or None if the text is empty.
+    """
+    if not text.strip():
+        return None
+
+    values = [int(float(x.strip())) for x in text.split(',')]
+    if len(values) != 6:
+        raise ValueError(f"Region of interest '{text}' must have six values.")
+
+    return [[values[i], values[i + 3]] for i in range(3)]
+
+
+def format_region_of_interest(region_of_interest):
+    return ", ".join(str(r[0]) for r in region_of_interest) + ", " + ", ".join(str(r[1]) for r in region_of_interest)
+
 
 class AutoSegmentationScene(object):
+    @traced('create scene')
     def __init__(self, model):
         self._model = model
         self._context = model.get_context()
         self._root_scene = model.get_root_scene()
         self._mesh_scene = model.get_mesh_scene()
         self._detection_scene = model.get_detection_scene()
+        self._surface_scene = model.get_surface_scene()
+        self._preview_scene = model.get_preview_scene()
         self._output_scene = model.get_output_scene()
         self._dimensions = model.get_dimensions()
         self._output_coordinates = model.get_output_coordinates()
@@ -26,8 +61,17 @@ class AutoSegmentationScene(object):
         self._outline_graphics = self._create_outline_graphics()
         self._iso_graphic = self._create_surface_graphics()
         self._segmentation_contour = self._create_segmentation_graphics()
+        model.set_tessellation_divisions(self.get_tessellation_divisions())
         self._segmentation_contour_material = model.get_contour_material()
         self._segmentation_contour.setMaterial(self._segmentation_contour_material)
+        self._segmentation_surface = self._create_segmentation_surface_graphics()
+        self._segmentation_surface.setMaterial(self._segmentation_contour_material)
+        self._segmentation_preview = self._create_segmentation_preview_graphics()
+        self._segmentation_preview.setMaterial(self._segmentation_contour_material)
+        self._segmentation_visibility = True
+        self._preview_mode = False
+        self._preview_shown = False
+        self._full_tessellation_divisions = None
         self._point_cloud = self._create_point_cloud_graphics()
         self._point_cloud.setMaterial(model.get_point_cloud_material())
         self._segmentation_mesh = self._create_mesh_graphics()
@@ -52,7 +96,7 @@ class AutoSegmentationScene(object):
     def _create_surface_graphics(self):
         field_module = self._model.get_field_module()
         finite_element_field = field_module.findFieldByName('coordinates')
-        xi_field = field_module.findFieldByName('xi')
+        texture_coordinate_field = self._model.get_texture_coordinate_field()
         scalar_field = self._model.get_scalar_field()
         image_field = self._model.get_source_image_field()
 
@@ -65,7 +109,7 @@ class AutoSegmentationScene(object):
             iso_graphic = self._root_scene.createGraphicsContours()
             iso_graphic.setCoordinateField(finite_element_field)
             iso_graphic.setMaterial(material)
-            iso_graphic.setTextureCoordinateField(xi_field)
+            iso_graphic.setTextureCoordinateField(texture_coordinate_field)
             iso_graphic.setIsoscalarField(scalar_field)
             iso_graphic.setListIsovalues([0.0])
 
@@ -73,9 +117,9 @@ class AutoSegmentationScene(object):
 
     def _create_segmentation_graphics(self):
         field_module = self._model.get_field_module()
-        dimension_field = field_module.createFieldConstant(self._dimensions)
-        xi_field = field_module.findFieldByName('xi')
-        scaled_xi_field = xi_field * self._scale_field * dimension_field
+        dimension_field = field_module.createFieldConstant(self._model.get_image_dimensions())
+        texture_coordinate_field = self._model.get_texture_coordinate_field()
+        scaled_xi_field = texture_coordinate_field * self._scale_field * dimension_field
         image_field = self._model.get_image_field()
         # windowed_image_field = self._model.get_windowed_image_field()
 
@@ -85,6 +129,7 @@ class AutoSegmentationScene(object):
 
         with ChangeManager(self._root_scene):
             segmentation_contour = self._root_scene.createGraphicsContours()
+            segmentation_contour.setName(SEGMENTATION_CONTOUR_GRAPHICS_NAME)
             segmentation_contour.setCoordinateField(scaled_xi_field)
             segmentation_contour.setTessellation(tessellation)
             segmentation_contour.setIsoscalarField(image_field)
@@ -93,6 +138,22 @@ class AutoSegmentationScene(object):
 
         return segmentation_contour
 
+    def _create_segmentation_surface_graphics(self):
+        with ChangeManager(self._surface_scene):
+            segmentation_surface = self._surface_scene.createGraphicsSurfaces()
+            segmentation_surface.setCoordinateField(self._model.get_surface_coordinates())
+            segmentation_surface.setVisibilityFlag(False)
+
+        return segmentation_surface
+
+    def _create_segmentation_preview_graphics(self):
+        with ChangeManager(self._preview_scene):
+            segmentation_preview = self._preview_scene.createGraphicsSurfaces()
+            segmentation_preview.setCoordinateField(self._model.get_preview_coordinates())
+            segmentation_preview.setVisibilityFlag(False)
+
+        return segmentation_preview
+
     def _create_point_cloud_graphics(self):
         with ChangeManager(self._output_scene):
             point_cloud = self._output_scene.createGraphicsPoints()
@@ -164,7 +225,42 @@ class AutoSegmentationScene(object):
         self._iso_graphic.setVisibilityFlag(state != 0)
 
     def set_segmentation_visibility(self, state):
-        self._segmentation_contour.setVisibilityFlag(state != 0)
+        self._segmentation_visibility = state != 0
+        numpy_engine = self._model.get_isosurface_engine() == ISOSURFACE_ENGINE_NUMPY
+        self._segmentation_contour.setVisibilityFlag(self._segmentation_visibility and not numpy_engine)
+        self._segmentation_surface.setVisibilityFlag(self._segmentation_visibility and numpy_engine and not self._preview_shown)
+        self._segmentation_preview.setVisibilityFlag(self._segmentation_visibility and numpy_engine and self._preview_shown)
+
+    def set_preview_mode(self, state):
+        """
+        While in preview mode the segmentation is shown at a lower resolution, the Zinc contours
+        use a coarser tessellation and the voxel isosurface shows preview surfaces once available.
+        """
+        if state == self._preview_mode:
+            return
+
+        self._preview_mode = state
+        tessellation = self._segmentation_contour.getTessellation()
+        with ChangeManager(self._root_scene):
+            if state:
+                self._full_tessellation_divisions = self.get_tessellation_divisions()
+                level = self._model.get_preview_level()
+                tessellation.setMinimumDivisions([max(1, d // level) for d in self._full_tessellation_divisions])
+            else:
+                tessellation.setMinimumDivisions(self._full_tessellation_divisions)
+                self._preview_shown = False
+                self.set_segmentation_visibility(self._segmentation_visibility)
+
+    def set_preview_surface(self, surface):
+        with ChangeManager(self._root_scene):
+            self._model.update_preview_surface(surface)
+            self._preview_shown = self._preview_mode
+            self.set_segmentation_visibility(self._segmentation_visibility)
+
+    def set_isosurface_engine(self, engine):
+        with ChangeManager(self._root_scene):
+            self._model.set_isosurface_engine(engine)
+            self.set_segmentation_visibility(self._segmentation_visibility)
 
     def set_point_cloud_visibility(self, state):
         self._point_cloud.setVisibilityFlag(state != 0)
@@ -175,13 +271,25 @@ class AutoSegmentationScene(object):
     def set_detection_plane_visibility(self, state):
         self._detection_plane.setVisibilityFlag(state != 0)
 
-    def set_slider_value(self, value):
+    def get_image_plane_position(self, value):
+        """
+        Get the z coordinate of the image plane for an image plane slider value between 0 and 100.
+        """
+        z_start = self._model.get_region_of_interest()[2][0]
         z_scale = self._model.get_scale()[2]
-        self._iso_graphic.setListIsovalues([value * self._dimensions[2] * z_scale / 100])
+        return (z_start + value * self._dimensions[2] / 100) * z_scale
+
+    def set_slider_value(self, value):
+        self._iso_graphic.setListIsovalues([self.get_image_plane_position(value)])
+
+    def set_region_of_interest(self, region_of_interest):
+        self._model.set_region_of_interest(region_of_interest)
+        self._dimensions = self._model.get_dimensions()
 
-    def set_segmentation_value(self, value):
-        adj_value = value / 10000.0
-        self._model.set_segmentation_value(adj_value)
+    @traced('set segmentation value')
+    def set_segmentation_value(self, value, surface=None):
+        adj_value = get_segmentation_value(value)
+        self._model.set_segmentation_value(adj_value, surface)
         self._update_segmentation_contour_value(adj_value)
 
     def get_tessellation_divisions(self):
@@ -189,6 +297,7 @@ class AutoSegmentationScene(object):
 
     def set_tessellation_divisions(self, divisions):
         self._segmentation_contour.getTessellation().setMinimumDivisions(divisions)
+        self._model.set_tessellation_divisions(self.get_tessellation_divisions())
 
     def update_scale(self):
         field_module = self._model.get_field_module()
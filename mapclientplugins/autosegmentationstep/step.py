@@ -24,8 +24,8 @@ from PySide6 import QtGui
 
 from mapclient.mountpoints.workflowstep import WorkflowStepMountPoint
 
-from mapclientplugins.autosegmentationstep.configuredialog import ConfigureDialog
-from mapclientplugins.autosegmentationstep.widgets.autosegmentationwidget import AutoSegmentationWidget
+# The icon resources, the configure dialog, the widget and the Zinc model behind it are imported
+# when first needed, so that scanning for plugins and creating the step only imports this module.
 
 
 class AutoSegmentationStep(WorkflowStepMountPoint):
@@ -33,7 +33,7 @@ class AutoSegmentationStep(WorkflowStepMountPoint):
         super(AutoSegmentationStep, self).__init__('Automatic Segmenter', location)
         self._configured = True
         self._category = 'Segmentation'
-        self._icon = QtGui.QImage(':/autosegmentation/images/autoseg.png')
+        self._icon = None
         self.addPort(('http://physiomeproject.org/workflow/1.0/rdf-schema#port',
                       'http://physiomeproject.org/workflow/1.0/rdf-schema#uses',
                       'http://physiomeproject.org/workflow/1.0/rdf-schema#images'))
@@ -48,13 +48,26 @@ class AutoSegmentationStep(WorkflowStepMountPoint):
                        'http://physiomeproject.org/workflow/1.0/rdf-schema#file_location')
                       ])
         self._config = {
-            'identifier': ''
+            'identifier': '',
+            'prefetch': False,
         }
 
         self._widget = None
+        self._load_widget = None
+        self._prefetch = None
         self._input_image_data = None
 
+    def getIcon(self):
+        if self._icon is None:
+            from mapclientplugins.autosegmentationstep import resources_rc  # noqa: F401
+
+            self._icon = QtGui.QImage(':/autosegmentation/images/autoseg.png')
+
+        return self._icon
+
     def configure(self):
+        from mapclientplugins.autosegmentationstep.configuredialog import ConfigureDialog
+
         dlg = ConfigureDialog(self._main_window)
         dlg.identifierOccursCount = self._identifierOccursCount
         dlg.set_config(self._config)
@@ -77,6 +90,8 @@ class AutoSegmentationStep(WorkflowStepMountPoint):
         return json.dumps(self._config, default=lambda o: o.__dict__, sort_keys=True, indent=4)
 
     def deserialize(self, string):
+        from mapclientplugins.autosegmentationstep.configuredialog import ConfigureDialog
+
         self._config.update(json.loads(string))
 
         d = ConfigureDialog()
@@ -86,15 +101,51 @@ class AutoSegmentationStep(WorkflowStepMountPoint):
 
     def execute(self):
         if not self._widget:
-            self._widget = AutoSegmentationWidget(self._input_image_data)
-            self._widget.set_location(os.path.join(self._location, self._config['identifier']))
-            self._widget.register_done_execution(self._doneExecution)
+            # Load the model in the background behind a progress view, the widget is created once it is ready.
+            if self._load_widget is None:
+                from mapclientplugins.autosegmentationstep.model.volumecache import VOLUME_CACHE_DIRECTORY
+                from mapclientplugins.autosegmentationstep.widgets.modelloadwidget import ModelLoadWidget
+
+                self._load_widget = ModelLoadWidget()
+                self._load_widget.model_loaded.connect(self._model_loaded)
+                self._load_widget.load(self._input_image_data, os.path.join(self._get_output_location(), VOLUME_CACHE_DIRECTORY), self._prefetch)
+            self._setCurrentWidget(self._load_widget)
+            return
+
+        self._widget.load_settings()
+        self._setCurrentWidget(self._widget)
+
+    def _get_output_location(self):
+        return os.path.join(self._location, self._config['identifier'])
+
+    def _model_loaded(self, model):
+        from mapclientplugins.autosegmentationstep.widgets.autosegmentationwidget import AutoSegmentationWidget
 
+        self._widget = AutoSegmentationWidget(self._input_image_data, model)
+        self._widget.set_location(self._get_output_location())
+        self._widget.register_done_execution(self._doneExecution)
+        self._load_widget.deleteLater()
+        self._load_widget = None
+        self._prefetch = None
         self._widget.load_settings()
         self._setCurrentWidget(self._widget)
 
     def setPortData(self, port_id, data_in):
         self._input_image_data = data_in
+        if self._config.get('prefetch', False) and self._widget is None and self._load_widget is None:
+            self._start_prefetch()
+
+    def _start_prefetch(self):
+        """
+        Decode the images into the volume cache in the background, ready for when the step is executed.
+        """
+        from mapclientplugins.autosegmentationstep.model.prefetch import VolumePrefetch
+        from mapclientplugins.autosegmentationstep.model.volumecache import VOLUME_CACHE_DIRECTORY
+
+        if self._prefetch is not None:
+            self._prefetch.cancel()
+        self._prefetch = VolumePrefetch(self._input_image_data.image_files(), os.path.join(self._get_output_location(), VOLUME_CACHE_DIRECTORY))
+        self._prefetch.start()
 
     def getPortData(self, index):
         if index == 2:
@@ -0,0 +1,163 @@
+"""
+Created: October, 2026
+
+Named timing spans of the segmentation pipeline, written as a Chrome trace.
+
+Tracing is off unless enabled with enable_tracing, or by setting the AUTOSEGMENTATION_TRACE
+environment variable to the trace file name. The trace file is written when tracing is
+disabled and when the program exits, and can be opened in Perfetto or chrome://tracing.
+"""
+import os
+import json
+import time
+import atexit
+import functools
+import threading
+
+TRACE_ENVIRONMENT_VARIABLE = 'AUTOSEGMENTATION_TRACE'
+TRACE_CATEGORY = 'autosegmentation'
+
+
+class Tracer(object):
+    """
+    Collect complete events, with their start and duration in microseconds, from any thread.
+    """
+
+    def __init__(self):
+        self._filename = None
+        self._events = []
+        self._thread_names = {}
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+
+    def is_enabled(self):
+        return self._filename is not None
+
+    def get_filename(self):
+        return self._filename
+
+    def enable(self, filename):
+        with self._lock:
+            self._filename = filename
+            self._events = []
+            self._thread_names = {}
+            self._origin = time.perf_counter()
+
+    def disable(self):
+        """
+        Stop tracing and write the trace file.
+        """
+        if self._filename is not None:
+            self.write()
+            self._filename = None
+
+    def get_time(self):
+        return (time.perf_counter() - self._origin) * 1.0e6
+
+    def add_event(self, name, start, duration, args=None):
+        thread = threading.current_thread()
+        event = {"name": name, "cat": TRACE_CATEGORY, "ph": "X", "ts": start, "dur": duration, "pid": os.getpid(), "tid": thread.ident}
+        if args:
+            event["args"] = args
+        with self._lock:
+            self._events.append(event)
+            self._thread_names[thread.ident] = thread.name
+
+    def get_events(self):
+        with self._lock:
+            thread_events = [{"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": ident, "args": {"name": name}}
+                             for ident, name in self._thread_names.items()]
+            return thread_events + list(self._events)
+
+    def write(self, filename=None):
+        filename = self._filename if filename is None else filename
+        with open(filename, 'w') as f:
+            json.dump({"traceEvents": self.get_events(), "displayTimeUnit": "ms"}, f)
+
+
+class _Span(object):
+
+    def __init__(self, tracer, name, args):
+        self._tracer = tracer
+        self._name = name
+        self._args = args
+        self._start = None
+
+    def set_arg(self, name, value):
+        self._args[name] = value
+
+    def __enter__(self):
+        self._start = self._tracer.get_time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self._args["error"] = exc_type.__name__
+        self._tracer.add_event(self._name, self._start, self._tracer.get_time() - self._start, self._args)
+        return False
+
+
+class _NullSpan(object):
+
+    def set_arg(self, name, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_tracer = Tracer()
+_null_span = _NullSpan()
+
+
+def get_tracer():
+    return _tracer
+
+
+def enable_tracing(filename):
+    _tracer.enable(filename)
+
+
+def disable_tracing():
+    _tracer.disable()
+
+
+def is_tracing_enabled():
+    return _tracer.is_enabled()
+
+
+def trace_span(name, **args):
+    """
+    Get a context manager timing the code it encloses as a span with the given name and
+    arguments. While tracing is disabled this is a shared span doing nothing.
+    """
+    if _tracer.is_enabled():
+        return _Span(_tracer, name, args)
+
+    return _null_span
+
+
+def traced(name):
+    """
+    Decorate a function to time every call as a span with the given name.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _tracer.is_enabled():
+                return function(*args, **kwargs)
+
+            with _Span(_tracer, name, {}):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+if os.environ.get(TRACE_ENVIRONMENT_VARIABLE):
+    enable_tracing(os.environ[TRACE_ENVIRONMENT_VARIABLE])
+atexit.register(disable_tracing)
@@ -15,9 +15,9 @@ from PySide6.QtGui import (QBrush, QColor, QConicalGradient, QCursor,
     QFont, QFontDatabase, QGradient, QIcon,
     QImage, QKeySequence, QLinearGradient, QPainter,
     QPalette, QPixmap, QRadialGradient, QTransform)
-from PySide6.QtWidgets import (QAbstractButton, QApplication, QDialog, QDialogButtonBox,
-    QFormLayout, QGridLayout, QGroupBox, QLabel,
-    QLineEdit, QSizePolicy, QWidget)
+from PySide6.QtWidgets import (QAbstractButton, QApplication, QCheckBox, QDialog,
+    QDialogButtonBox, QFormLayout, QGridLayout, QGroupBox,
+    QLabel, QLineEdit, QSizePolicy, QWidget)
 
 class Ui_ConfigureDialog(object):
     def setupUi(self, ConfigureDialog):
@@ -40,6 +40,11 @@ class Ui_ConfigureDialog(object):
 
         self.formLayout.setWidget(0, QFormLayout.FieldRole, self.lineEdit0)
 
+        self.prefetchCheckBox = QCheckBox(self.configGroupBox)
+        self.prefetchCheckBox.setObjectName(u"prefetchCheckBox")
+
+        self.formLayout.setWidget(1, QFormLayout.FieldRole, self.prefetchCheckBox)
+
 
         self.gridLayout.addWidget(self.configGroupBox, 0, 0, 1, 1)
 
@@ -62,5 +67,10 @@ class Ui_ConfigureDialog(object):
         ConfigureDialog.setWindowTitle(QCoreApplication.translate("ConfigureDialog", u"ConfigureDialog", None))
         self.configGroupBox.setTitle("")
         self.label0.setText(QCoreApplication.translate("ConfigureDialog", u"identifier:  ", None))
+#if QT_CONFIG(tooltip)
+        self.prefetchCheckBox.setToolTip(QCoreApplication.translate("ConfigureDialog", u"Start decoding the images into the volume cache as soon as they are\n"
+"received, so the step opens faster when it is reached in the workflow.", None))
+#endif // QT_CONFIG(tooltip)
+        self.prefetchCheckBox.setText(QCoreApplication.translate("ConfigureDialog", u"Prefetch images when received", None))
     # retranslateUi
 
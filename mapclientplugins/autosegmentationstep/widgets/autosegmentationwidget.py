@@ -8,21 +8,19 @@ import json
 import pathlib
 import hashlib
 
-# import matplotlib.pyplot as plt
-
 from PySide6 import QtWidgets, QtCore, QtGui
 
-from cmlibs.exporter.stl import ArgonSceneExporter as STLExporter
-from cmlibs.importer.stl import import_data_into_region as stl_import_data_into_region
-from cmlibs.utils.zinc.field import create_field_coordinates
-from cmlibs.utils.zinc.general import ChangeManager
-from cmlibs.utils.zinc.mesh import find_connected_mesh_elements_0d
 from cmlibs.widgets.handlers.scenemanipulation import SceneManipulation
 from cmlibs.widgets.handlers.orientation import Orientation
 from cmlibs.widgets.handlers.fixedaxistranslation import FixedAxisTranslation
 
-from mapclientplugins.autosegmentationstep.model.autosegmentationmodel import AutoSegmentationModel
-from mapclientplugins.autosegmentationstep.scene.autosegmentationscene import AutoSegmentationScene
+from mapclientplugins.autosegmentationstep.model.autosegmentationmodel import (
+    ISOSURFACE_ENGINES, ISOSURFACE_ENGINE_NUMPY)
+from mapclientplugins.autosegmentationstep.model.histogram import plot_histogram
+from mapclientplugins.autosegmentationstep.model.pointsampler import POINT_SAMPLING_POISSON_DISK, POINT_SAMPLING_RANDOM
+from mapclientplugins.autosegmentationstep.scene.autosegmentationscene import (
+    AutoSegmentationScene, format_region_of_interest, get_slider_value, parse_region_of_interest)
+from mapclientplugins.autosegmentationstep.widgets.segmentationscheduler import SegmentationUpdateScheduler
 from mapclientplugins.autosegmentationstep.widgets.ui_autosegmentationwidget import Ui_AutoSegmentationWidget
 
 
@@ -37,21 +35,20 @@ def _set_vector_validator(editor, regex):
 
 class AutoSegmentationWidget(QtWidgets.QWidget):
 
-    def __init__(self, image_data, parent=None):
+    def __init__(self, image_data, model, parent=None):
         QtWidgets.QWidget.__init__(self, parent)
         self._ui = Ui_AutoSegmentationWidget()
         self._ui.setupUi(self)
 
-        self._ui.histogramPushButton.setVisible(False)
-
         self._callback = None
         self._location = None
         self._input_hash = None
         self._detection_current = False
 
         self._image_data = image_data
-        self._model = AutoSegmentationModel(image_data)
+        self._model = model
         self._scene = AutoSegmentationScene(self._model)
+        self._segmentation_scheduler = SegmentationUpdateScheduler(self._model, self._scene, parent=self)
         self._view = self._ui.zincWidget
 
         self._set_point_density_validator()
@@ -69,8 +66,11 @@ class AutoSegmentationWidget(QtWidgets.QWidget):
         self._view.register_handler(normal_handler)
 
         self._setup_tessellation_line_edit()
+        self._setup_isosurface_engine_combo_box()
+        self._setup_threshold_suggestion_menu()
         self._set_scale_validator()
-        display_dimensions = ", ".join([f"{d}" for d in self._model.get_dimensions()])
+        self._set_region_of_interest_validator()
+        display_dimensions = ", ".join([f"{d}" for d in self._model.get_image_dimensions()])
         self._ui.imagePixelOutputLabel.setText(f"{display_dimensions} px")
 
         self._make_connections()
@@ -79,11 +79,18 @@ class AutoSegmentationWidget(QtWidgets.QWidget):
     def _make_connections(self):
         self._ui.isoValueSlider.valueChanged.connect(self._scene.set_slider_value)
         self._ui.isoValueSlider.valueChanged.connect(self._set_line_edit_value)
-        self._ui.segmentationValueSlider.valueChanged.connect(self._scene.set_segmentation_value)
+        self._ui.segmentationValueSlider.valueChanged.connect(self._segmentation_scheduler.schedule)
+        self._segmentation_scheduler.update_failed.connect(self._segmentation_update_failed)
+        self._ui.segmentationValueSlider.sliderPressed.connect(self._segmentation_slider_pressed)
+        self._ui.segmentationValueSlider.sliderReleased.connect(self._slider_released)
+        self._ui.isoValueSlider.sliderPressed.connect(self._iso_value_slider_pressed)
+        self._ui.isoValueSlider.sliderReleased.connect(self._slider_released)
         self._ui.segmentationValueSlider.valueChanged.connect(self._set_line_edit_value)
         self._ui.tessellationDivisionsLineEdit.editingFinished.connect(self._update_tessellation)
+        self._ui.isosurfaceEngineComboBox.currentIndexChanged.connect(self._isosurface_engine_changed)
         self._ui.pointSizeLineEdit.editingFinished.connect(self._update_point_size)
         self._ui.scalingLineEdit.editingFinished.connect(self._update_scale)
+        self._ui.regionOfInterestLineEdit.editingFinished.connect(self._update_region_of_interest)
         self._ui.allowHighTessellationsCheckBox.stateChanged.connect(self._set_tessellation_validator)
         self._ui.imagePlaneCheckBox.stateChanged.connect(self._scene.set_image_plane_visibility)
         self._ui.segmentationCheckBox.stateChanged.connect(self._scene.set_segmentation_visibility)
@@ -109,41 +116,55 @@ class AutoSegmentationWidget(QtWidgets.QWidget):
         return field_module.createFieldGroup()
 
     def _update_connected_groups(self, result):
+        # The field group of a connected surface is only created when it is chosen.
         self._ui.comboBoxConnectedSurfaces.clear()
-        field = self._model.get_mesh_coordinates()
-        field_module = field.getFieldmodule()
-        with ChangeManager(field_module):
-            mesh = field_module.findMeshByDimension(2)
-            self._ui.comboBoxConnectedSurfaces.addItem("--", field_module.createFieldGroup())
-            for i, r in enumerate(result):
-                field_group = field_module.createFieldGroup()
-                field_group.setName(f"el_group_{i + 1:02}")
-                mesh_group = field_group.createMeshGroup(mesh)
-                for e_id in r:
-                    e = mesh.findElementByIdentifier(e_id)
-                    mesh_group.addElement(e)
-                self._ui.comboBoxConnectedSurfaces.addItem(field_group.getName(), field_group)
+        self._ui.comboBoxConnectedSurfaces.addItem("--", -1)
+        for i in range(len(result)):
+            self._ui.comboBoxConnectedSurfaces.addItem(f"el_group_{i + 1:02}", i)
 
     def _connected_subgroup_changed(self, value):
-        group = self._ui.comboBoxConnectedSurfaces.currentData() if value >= 0 else self._create_mesh_field_group()
-        if group:
-            self._scene.set_mesh_group(group, value > 0)
+        index = self._ui.comboBoxConnectedSurfaces.currentData() if value >= 0 else -1
+        if index is None:
+            return
+
+        group = self._model.create_connected_surface_group(index) if index >= 0 else self._create_mesh_field_group()
+        self._scene.set_mesh_group(group, index >= 0)
+
+    def _segmentation_update_failed(self, message):
+        QtWidgets.QMessageBox.warning(self, "Segmentation", f"Calculating the segmentation surface failed.\n\n{message}")
+
+    def _segmentation_slider_pressed(self):
+        self._segmentation_scheduler.set_interactive(True)
+
+    def _iso_value_slider_pressed(self):
+        # Moving the image plane does not change the Zinc contours, only the voxel isosurface is previewed.
+        if self._model.get_isosurface_engine() == ISOSURFACE_ENGINE_NUMPY:
+            self._segmentation_scheduler.set_interactive(True)
+
+    def _slider_released(self):
+        self._segmentation_scheduler.set_interactive(False)
+
+    def _isosurface_engine_changed(self, index):
+        self._scene.set_isosurface_engine(self._ui.isosurfaceEngineComboBox.itemData(index))
+        self._segmentation_scheduler.invalidate()
+        numpy_engine = self._model.get_isosurface_engine() == ISOSURFACE_ENGINE_NUMPY
+        self._ui.tessellationDivisionsLineEdit.setEnabled(not numpy_engine)
+        self._ui.allowHighTessellationsCheckBox.setEnabled(not numpy_engine)
+        self._detection_current = False
 
     def _target_specific_value_changed(self, state):
         self._model.set_targeted_mode(state == 2)
         self._scene.targeted_mode_changed()
+        self._segmentation_scheduler.invalidate()
 
     def _toggle_detection_mode(self, checked):
+        self._segmentation_scheduler.flush()
         if checked and not self._detection_current:
             self._detection_current = True
             self._ui.comboBoxConnectedSurfaces.clear()
             self._ui.comboBoxConnectedSurfaces.addItem("Pending")
             self._ui.comboBoxConnectedSurfaces.setEnabled(False)
-            self._model.clear_segmentation_mesh()
-            self._transform_contours_to_mesh()
-            self._generate_segmentation_mesh(self._model.get_mesh_coordinates())
-
-            connected_elements = find_connected_mesh_elements_0d(self._model.get_mesh_coordinates(), 2, True)
+            connected_elements = self._model.generate_connected_segmentation_mesh()
             self._update_connected_groups(connected_elements)
 
         self._scene.set_mesh_visibility(checked)
@@ -166,56 +187,17 @@ class AutoSegmentationWidget(QtWidgets.QWidget):
 
     def _write_point_cloud(self):
         self._create_location()
-        self._model.get_output_region().writeFile(self.get_output_filename())
-
-    def _transform_exported_mesh_to_exf(self):
-        root_region = self._model.get_root_region()
-        temp_region = root_region.createChild("__temp")
-        field_module = temp_region.getFieldmodule()
-        coordinate_field = create_field_coordinates(field_module)
-
-        self._generate_segmentation_mesh(coordinate_field)
-
-        temp_region.writeFile(self.get_segmentation_graphics_filename())
-        root_region.removeChild(temp_region)
-
-    def _generate_segmentation_mesh(self, coordinate_field):
-        inputs_stl = os.path.join(self._location, "ArgonSceneExporterSTL_zinc_graphics.stl")
-        if not os.path.exists(inputs_stl):
-            return
-
-        region = coordinate_field.getFieldmodule().getRegion()
-        stl_import_data_into_region(region, inputs_stl)
-
-        # Delete the WebGL JSON files.
-        os.remove(inputs_stl)
+        self._model.write_point_cloud(self.get_output_filename())
 
     def _export_segmentation_graphics(self):
-        self._transform_contours_to_mesh()
-        self._transform_exported_mesh_to_exf()
-
-    def _transform_contours_to_mesh(self):
-        # Export the scene into an STL file.
-        self._hide_graphics()
-        scene = self._model.get_root_scene()
-        scene_filter = self._model.get_context().getScenefiltermodule().getDefaultScenefilter()
-        alt_scene_exporter = STLExporter(self._location)
         self._create_location()
-        alt_scene_exporter.export_stl_from_scene(scene, scene_filter)
-        self._reinstate_graphics()
+        self._model.write_segmentation_mesh(self.get_segmentation_graphics_filename())
 
     def _generate_input_hash(self):
         normalised_file_paths = [pathlib.PureWindowsPath(os.path.relpath(file_path, self._location)).as_posix()
                                  for file_path in self._image_data.image_files()]
         return hashlib.md5(json.dumps(normalised_file_paths).encode('utf-8')).hexdigest()
 
-    def _hide_graphics(self):
-        self._scene.set_outline_visibility(0)
-        self._scene.set_image_plane_visibility(0)
-        self._scene.set_point_cloud_visibility(0)
-        self._scene.set_detection_plane_visibility(0)
-        self._scene.set_mesh_visibility(0)
-
     def _reinstate_graphics(self):
         self._scene.set_outline_visibility(1 if self._ui.outlineCheckBox.isChecked() else 0)
         self._scene.set_segmentation_visibility(1 if self._ui.segmentationCheckBox.isChecked() else 0)
@@ -225,6 +207,7 @@ class AutoSegmentationWidget(QtWidgets.QWidget):
         self._scene.set_mesh_visibility(1 if self._ui.checkBoxToggleDetection.isChecked() else 0)
 
     def _done_execution(self):
+        self._segmentation_scheduler.flush()
         self._save_settings()
         # self._import_segmentation_mesh()
         self._write_point_cloud()
@@ -253,25 +236,30 @@ class AutoSegmentationWidget(QtWidgets.QWidget):
         self._ui.allowHighTessellationsCheckBox.setChecked(settings.get("tessellation-override", False))
         self._ui.overrideScalingCheckBox.setChecked(settings.get("scaling-override", False))
         self._ui.scalingLineEdit.setText(settings.get("scaling", "1, 1, 1"))
+        self._ui.regionOfInterestLineEdit.setText(settings.get("region-of-interest", ""))
+        self._set_region_of_interest()
         self._ui.segmentationMeshAlphaDoubleSpinBox.setValue(settings.get("mesh-alpha", 1.0))
         self._ui.detectionPlaneAlphaDoubleSpinBox.setValue(settings.get("plane-alpha", 1.0))
         self._ui.checkBoxTargetSpecificValue.setChecked(settings.get("target-specific", False))
+        engine_index = self._ui.isosurfaceEngineComboBox.findData(settings.get("isosurface-engine", self._model.get_isosurface_engine()))
+        self._ui.isosurfaceEngineComboBox.setCurrentIndex(max(0, engine_index))
 
         dimensions = self._model.get_dimensions()
         min_dim = max(1, min(dimensions))
         self._ui.tessellationDivisionsLineEdit.setText(settings.get("tessellation", ", ".join([str(int(d / 2 + 0.5)) for d in dimensions])))
         self._ui.pointDensityLineEdit.setText(settings.get("point-density", f'{10000 / min_dim ** 2}'))
         self._ui.pointSizeLineEdit.setText(settings.get("point-size", f'{min_dim / 100}'))
+        self._ui.evenPointSpacingCheckBox.setChecked(settings.get("point-sampling", POINT_SAMPLING_RANDOM) == POINT_SAMPLING_POISSON_DISK)
 
-        z_size = dimensions[2]
-        z_scale = self._model.get_scale()[2]
-        self._ui.isoValueLineEdit.setText(f"{self._ui.isoValueSlider.value() * z_size * z_scale / 100.0}")
+        self._ui.isoValueLineEdit.setText(f"{self._scene.get_image_plane_position(self._ui.isoValueSlider.value())}")
 
         if os.path.isfile(self.get_output_filename()):
             self._model.get_output_region().readFile(self.get_output_filename())
 
         self._update_point_size()
         self._update_scale()
+        # Calculate the surface once, for all the settings, on a worker thread.
+        self._segmentation_scheduler.schedule(self._ui.segmentationValueSlider.value())
 
     def _save_settings(self):
         if not os.path.exists(self._location):
@@ -290,11 +278,14 @@ class AutoSegmentationWidget(QtWidgets.QWidget):
             "tessellation-override": self._ui.allowHighTessellationsCheckBox.isChecked(),
             "scaling-override": self._ui.overrideScalingCheckBox.isChecked(),
             "scaling": self._ui.scalingLineEdit.text(),
+            "region-of-interest": self._ui.regionOfInterestLineEdit.text(),
             "point-density": self._ui.pointDensityLineEdit.text(),
             "point-size": self._ui.pointSizeLineEdit.text(),
+            "point-sampling": POINT_SAMPLING_POISSON_DISK if self._ui.evenPointSpacingCheckBox.isChecked() else POINT_SAMPLING_RANDOM,
             "mesh-alpha": self._ui.segmentationMeshAlphaDoubleSpinBox.value(),
             "plane-alpha": self._ui.detectionPlaneAlphaDoubleSpinBox.value(),
             "target-specific": self._ui.checkBoxTargetSpecificValue.isChecked(),
+            "isosurface-engine": self._ui.isosurfaceEngineComboBox.currentData(),
         }
 
         with open(self._settings_file(), "w") as f:
@@ -311,9 +302,7 @@ class AutoSegmentationWidget(QtWidgets.QWidget):
 
     def _set_line_edit_value(self, value):
         if self.sender() == self._ui.isoValueSlider:
-            z_size = self._model.get_dimensions()[2]
-            z_scale = self._model.get_scale()[2]
-            self._ui.isoValueLineEdit.setText(f"{value * z_size * z_scale / 100.0}")
+            self._ui.isoValueLineEdit.setText(f"{self._scene.get_image_plane_position(value)}")
         elif self.sender() == self._ui.segmentationValueSlider:
             self._ui.segmentationValueLineEdit.setText(f"{value / 10000.0}")
             self._detection_current = False
@@ -325,10 +314,41 @@ class AutoSegmentationWidget(QtWidgets.QWidget):
 
         self._set_tessellation_validator()
 
+    def _setup_threshold_suggestion_menu(self):
+        menu = QtWidgets.QMenu(self._ui.suggestThresholdPushButton)
+        menu.aboutToShow.connect(self._populate_threshold_suggestion_menu)
+        menu.triggered.connect(self._threshold_suggestion_triggered)
+        self._ui.suggestThresholdPushButton.setMenu(menu)
+
+    def _populate_threshold_suggestion_menu(self):
+        menu = self._ui.suggestThresholdPushButton.menu()
+        menu.clear()
+        QtWidgets.QApplication.setOverrideCursor(QtCore.Qt.CursorShape.WaitCursor)
+        try:
+            suggestions = self._model.get_threshold_suggestions()
+        finally:
+            QtWidgets.QApplication.restoreOverrideCursor()
+
+        for suggestion in suggestions:
+            action = menu.addAction(f"{suggestion.get_description()}: {suggestion.get_value():.4f}")
+            action.setData(suggestion.get_value())
+
+    def _threshold_suggestion_triggered(self, action):
+        self._ui.segmentationValueSlider.setValue(get_slider_value(action.data()))
+        self._segmentation_scheduler.flush()
+
+    def _setup_isosurface_engine_combo_box(self):
+        for engine, description in ISOSURFACE_ENGINES.items():
+            self._ui.isosurfaceEngineComboBox.addItem(description, engine)
+
     def _set_scale_validator(self):
         regex = QtCore.QRegularExpression("^[0-9.]+((, ?[0-9.]+){2})?$")
         _set_vector_validator(self._ui.scalingLineEdit, regex)
 
+    def _set_region_of_interest_validator(self):
+        regex = QtCore.QRegularExpression("^([0-9]+(, ?[0-9]+){5})?$")
+        _set_vector_validator(self._ui.regionOfInterestLineEdit, regex)
+
     def _set_tessellation_validator(self):
         size = 5 if self._ui.allowHighTessellationsCheckBox else 3
         regex = QtCore.QRegularExpression(f"^[0-9]{{1,{size}}}((, ?[0-9]{{1,{size}}}){{2}})?$")
@@ -345,6 +365,26 @@ class AutoSegmentationWidget(QtWidgets.QWidget):
         divisions_list = [int(x.strip()) for x in text.split(',')]
         self._scene.set_tessellation_divisions(divisions_list)
 
+    def _set_region_of_interest(self):
+        self._scene.set_region_of_interest(parse_region_of_interest(self._ui.regionOfInterestLineEdit.text()))
+        self._segmentation_scheduler.invalidate()
+        self._scene.set_slider_value(self._ui.isoValueSlider.value())
+        self._ui.isoValueLineEdit.setText(f"{self._scene.get_image_plane_position(self._ui.isoValueSlider.value())}")
+        self._detection_current = False
+
+    def _update_region_of_interest(self):
+        previous_dimensions = self._model.get_dimensions()
+        self._set_region_of_interest()
+        region_of_interest = self._model.get_region_of_interest()
+        if self._ui.regionOfInterestLineEdit.text():
+            self._ui.regionOfInterestLineEdit.setText(format_region_of_interest(region_of_interest))
+
+        # Keep the tessellation resolution per pixel over the new region.
+        dimensions = self._model.get_dimensions()
+        divisions = [max(1, int(d * n / p + 0.5)) for d, n, p in zip(self._scene.get_tessellation_divisions(), dimensions, previous_dimensions)]
+        self._ui.tessellationDivisionsLineEdit.setText(", ".join(str(d) for d in divisions))
+        self._update_tessellation()
+
     def _update_point_size(self):
         size = self._ui.pointSizeLineEdit.text()
         if size:
@@ -356,17 +396,25 @@ class AutoSegmentationWidget(QtWidgets.QWidget):
             scale = [float(x.strip()) for x in text.split(',')]
             self._model.set_scale(scale)
             self._scene.update_scale()
+            self._segmentation_scheduler.invalidate()
 
     def _generate_points(self):
+        self._segmentation_scheduler.flush()
         self._scene.set_image_plane_visibility(0)
         self._scene.set_segmentation_visibility(1)
-        self._model.generate_points(float(self._ui.pointDensityLineEdit.text()))
-        # After the segmentation has been exported the graphics
-        # will be re-instated to the correct state.
+        sampling = POINT_SAMPLING_POISSON_DISK if self._ui.evenPointSpacingCheckBox.isChecked() else POINT_SAMPLING_RANDOM
+        self._model.generate_points(float(self._ui.pointDensityLineEdit.text()), sampling=sampling)
         self._export_segmentation_graphics()
+        self._reinstate_graphics()
 
     def _histogram_clicked(self):
-        data = self._model.get_histogram_data()
-        plt.hist(data, bins=len(data))
-        plt.gca().set(title='Frequency Histogram', ylabel='Frequency')
-        plt.show()
+        # Matplotlib is only needed to show the histogram, it is imported when first shown.
+        try:
+            import matplotlib.pyplot as plt
+        except ImportError:
+            QtWidgets.QMessageBox.warning(self, "Histogram", "Showing the histogram requires matplotlib to be installed.")
+            return
+
+        figure, axes = plt.subplots()
+        plot_histogram(self._model.get_histogram_data(), axes)
+        figure.show()
@@ -0,0 +1,187 @@
+"""
+Created: October, 2026
+
+Load the segmentation model on a worker thread behind a progress view.
+"""
+import traceback
+
+from PySide6 import QtCore, QtWidgets
+
+from mapclientplugins.autosegmentationstep.model.autosegmentationmodel import LOAD_PHASE_DECODE, LOAD_PHASES, AutoSegmentationModel, LoadCancelled
+
+# Seconds between checks for cancellation while waiting for a prefetch to finish.
+PREFETCH_POLL_INTERVAL = 0.1
+
+
+class _ModelLoadTaskSignals(QtCore.QObject):
+    progress = QtCore.Signal(int, str, int, int)
+    finished = QtCore.Signal(int, object)
+    failed = QtCore.Signal(int, str)
+    cancelled = QtCore.Signal(int)
+
+
+class _ModelLoadTask(QtCore.QRunnable):
+
+    def __init__(self, image_data, cache_location, prefetch, generation, is_current):
+        super().__init__()
+        self.signals = _ModelLoadTaskSignals()
+        self._image_data = image_data
+        self._cache_location = cache_location
+        self._prefetch = prefetch
+        self._generation = generation
+        self._is_current = is_current
+
+    def _progress(self, phase, completed, total):
+        self.signals.progress.emit(self._generation, phase, completed, total)
+
+    def run(self):
+        if self._prefetch is not None:
+            # Let the prefetch finish filling the volume cache rather than decoding the images twice.
+            self._progress(LOAD_PHASE_DECODE, 0, 0)
+            while not self._prefetch.wait(PREFETCH_POLL_INTERVAL):
+                if not self._is_current(self._generation):
+                    self.signals.cancelled.emit(self._generation)
+                    return
+
+        try:
+            model = AutoSegmentationModel(self._image_data, self._cache_location, self._progress,
+                                          is_cancelled=lambda: not self._is_current(self._generation))
+        except LoadCancelled:
+            self.signals.cancelled.emit(self._generation)
+            return
+        except Exception:
+            self.signals.failed.emit(self._generation, traceback.format_exc())
+            return
+
+        self.signals.finished.emit(self._generation, model)
+
+
+class ModelLoadWidget(QtWidgets.QWidget):
+    """
+    Show the progress of each phase of loading the model, with a button to cancel the load
+    and to retry it once cancelled or failed. Emits model_loaded with the model once ready,
+    the scene is then created on the GUI thread by the caller.
+    """
+
+    model_loaded = QtCore.Signal(object)
+
+    def __init__(self, parent=None):
+        QtWidgets.QWidget.__init__(self, parent)
+        self._image_data = None
+        self._cache_location = None
+        self._prefetch = None
+        self._generation = 0
+        self._loading = False
+        self._thread_pool = QtCore.QThreadPool(self)
+        self._thread_pool.setMaxThreadCount(1)
+
+        self._phase_label = QtWidgets.QLabel(self)
+        self._progress_bar = QtWidgets.QProgressBar(self)
+        self._message_label = QtWidgets.QLabel(self)
+        self._message_label.setWordWrap(True)
+        self._message_label.setTextInteractionFlags(QtCore.Qt.TextInteractionFlag.TextSelectableByMouse)
+        self._button = QtWidgets.QPushButton(self)
+        self._button.clicked.connect(self._button_clicked)
+
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.addStretch()
+        layout.addWidget(self._phase_label)
+        layout.addWidget(self._progress_bar)
+        layout.addWidget(self._message_label)
+        button_layout = QtWidgets.QHBoxLayout()
+        button_layout.addStretch()
+        button_layout.addWidget(self._button)
+        layout.addLayout(button_layout)
+        layout.addStretch()
+
+    def load(self, image_data, cache_location=None, prefetch=None):
+        """
+        Start loading the model, after waiting for the VolumePrefetch of the images if given.
+        """
+        self._image_data = image_data
+        self._cache_location = cache_location
+        self._prefetch = prefetch
+        self._start()
+
+    def cancel(self):
+        # The worker stops at its next progress report.
+        self._generation += 1
+        self._loading = False
+        self._phase_label.setText("Cancelling")
+        self._button.setEnabled(False)
+
+    def is_loading(self):
+        return self._loading
+
+    def _is_current(self, generation):
+        return generation == self._generation
+
+    def _start(self):
+        self._generation += 1
+        self._loading = True
+        self._phase_label.setText(LOAD_PHASES[0])
+        self._progress_bar.setRange(0, 0)
+        self._message_label.clear()
+        self._button.setText("Cancel")
+        self._button.setEnabled(True)
+        task = _ModelLoadTask(self._image_data, self._cache_location, self._prefetch, self._generation, self._is_current)
+        task.signals.progress.connect(self._load_progress)
+        task.signals.finished.connect(self._load_finished)
+        task.signals.failed.connect(self._load_failed)
+        task.signals.cancelled.connect(self._load_cancelled)
+        self._thread_pool.start(task)
+
+    def _button_clicked(self):
+        if self._loading:
+            self.cancel()
+        else:
+            self._start()
+
+    def _load_progress(self, generation, phase, completed, total):
+        if not self._is_current(generation):
+            return
+
+        phase_number = LOAD_PHASES.index(phase) + 1 if phase in LOAD_PHASES else 0
+        self._phase_label.setText(f"{phase} ({phase_number} of {len(LOAD_PHASES)})")
+        # A busy indicator for phases without intermediate progress.
+        self._progress_bar.setRange(0, total if total > 1 else 0)
+        self._progress_bar.setValue(completed)
+
+    def _stale_load_stopped(self, generation):
+        """
+        Handle the end of a load which is no longer current, shown as cancelled unless another
+        load has started since.
+
+        :return: True if the load is no longer current.
+        """
+        if self._is_current(generation):
+            return False
+
+        if not self._loading:
+            self._show_stopped("Loading cancelled", "")
+        return True
+
+    def _load_finished(self, generation, model):
+        if self._stale_load_stopped(generation):
+            return
+
+        self._loading = False
+        self.model_loaded.emit(model)
+
+    def _load_failed(self, generation, message):
+        if self._stale_load_stopped(generation):
+            return
+
+        self._loading = False
+        self._show_stopped("Loading failed", message)
+
+    def _load_cancelled(self, generation):
+        self._stale_load_stopped(generation)
+
+    def _show_stopped(self, text, message):
+        self._phase_label.setText(text)
+        self._progress_bar.setRange(0, 1)
+        self._progress_bar.setValue(0)
+        self._message_label.setText(message)
+        self._button.setText("Retry")
+        self._button.setEnabled(True)
@@ -0,0 +1,160 @@
+"""
+Created: October, 2026
+
+Debounced, cancellable recalculation of the segmentation surface.
+"""
+import logging
+import traceback
+
+from PySide6 import QtCore
+
+from mapclientplugins.autosegmentationstep.model.autosegmentationmodel import ISOSURFACE_ENGINE_NUMPY
+from mapclientplugins.autosegmentationstep.model.isosurface import ExtractionCancelled
+from mapclientplugins.autosegmentationstep.scene.autosegmentationscene import get_segmentation_value
+
+DEFAULT_DELAY_MS = 150
+
+logger = logging.getLogger(__name__)
+
+
+class _SurfaceTaskSignals(QtCore.QObject):
+    # Generation, slider value, pyramid level, surface or None on failure, and the error message on failure.
+    finished = QtCore.Signal(int, int, int, object, str)
+
+
+class _SurfaceTask(QtCore.QRunnable):
+    """
+    Extract a segmentation surface on a worker thread, from a snapshot of the model state taken
+    on the GUI thread when the task is created.
+    """
+
+    def __init__(self, extraction, generation, value, level, is_current):
+        super().__init__()
+        self.signals = _SurfaceTaskSignals()
+        self._extraction = extraction
+        self._generation = generation
+        self._value = value
+        self._level = level
+        self._is_current = is_current
+
+    def run(self):
+        try:
+            surface = self._extraction(lambda: not self._is_current(self._generation))
+        except ExtractionCancelled:
+            return
+        except Exception:
+            logger.exception("Extracting the segmentation surface failed.")
+            self.signals.finished.emit(self._generation, self._value, self._level, None, traceback.format_exc())
+            return
+
+        self.signals.finished.emit(self._generation, self._value, self._level, surface, "")
+
+
+class SegmentationUpdateScheduler(QtCore.QObject):
+    """
+    Coalesce rapid changes of the segmentation value and other settings and calculate the
+    new segmentation surface on a worker thread.
+
+    The scene is only updated once the surface for the latest value is ready, surfaces
+    being calculated for superseded values are cancelled. While interactive, surfaces are
+    calculated from a coarse level of the image pyramid and shown as previews, the full
+    resolution surface is calculated once the interaction ends. If calculating the full
+    resolution surface fails, update_failed is emitted with the error message.
+    """
+
+    update_failed = QtCore.Signal(str)
+
+    def __init__(self, model, scene, delay=DEFAULT_DELAY_MS, parent=None):
+        super().__init__(parent)
+        self._model = model
+        self._scene = scene
+        self._generation = 0
+        self._pending_value = None
+        self._current_value = None
+        self._interactive = False
+        self._thread_pool = QtCore.QThreadPool(self)
+        self._thread_pool.setMaxThreadCount(2)
+        self._timer = QtCore.QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(delay)
+        self._timer.timeout.connect(self._start_update)
+
+    def schedule(self, value):
+        self._pending_value = value
+        self._generation += 1
+        self._timer.start()
+
+    def set_interactive(self, state):
+        if state == self._interactive:
+            return
+
+        self._interactive = state
+        self._scene.set_preview_mode(state)
+        numpy_engine = self._model.get_isosurface_engine() == ISOSURFACE_ENGINE_NUMPY
+        if state:
+            if numpy_engine and self._pending_value is None and self._current_value is not None:
+                # Preview the current surface for the duration of the interaction.
+                self._start_task(self._current_value, self._model.get_preview_level())
+        else:
+            self._timer.stop()
+            self._generation += 1
+            if self._pending_value is not None and self._pending_value != self._current_value:
+                self._start_update()
+            else:
+                self._pending_value = None
+
+    def invalidate(self):
+        """
+        Recalculate the surface for the latest value after other segmentation settings have changed.
+        """
+        value = self._current_value if self._pending_value is None else self._pending_value
+        if value is not None:
+            self.schedule(value)
+
+    def flush(self):
+        """
+        Apply the latest scheduled value and settings immediately, cancelling any calculation in progress.
+        """
+        self._timer.stop()
+        if self._pending_value is not None:
+            value = self._pending_value
+            self._generation += 1
+            self._pending_value = None
+            self._current_value = value
+            self._scene.set_segmentation_value(value)
+        if self._model.is_segmentation_surface_stale():
+            self._model.update_segmentation_surface()
+
+    def _is_current(self, generation):
+        return generation == self._generation
+
+    def _start_update(self):
+        if self._model.get_isosurface_engine() != ISOSURFACE_ENGINE_NUMPY:
+            # Zinc contours are calculated by Zinc when the scene is next drawn.
+            self.flush()
+            return
+
+        self._start_task(self._pending_value, self._model.get_preview_level() if self._interactive else 1)
+
+    def _start_task(self, value, level):
+        extraction = self._model.create_surface_extraction(get_segmentation_value(value), level)
+        task = _SurfaceTask(extraction, self._generation, value, level, self._is_current)
+        task.signals.finished.connect(self._update_finished)
+        self._thread_pool.start(task)
+
+    def _update_finished(self, generation, value, level, surface, message):
+        if not self._is_current(generation):
+            return
+
+        if surface is None:
+            # A failed preview is not shown, the full resolution surface is still calculated when the interaction ends.
+            if level == 1:
+                self._pending_value = None
+                self.update_failed.emit(message)
+        elif level > 1:
+            if self._interactive:
+                self._scene.set_preview_surface(surface)
+        else:
+            self._pending_value = None
+            self._current_value = value
+            self._scene.set_segmentation_value(value, surface)
@@ -115,6 +115,11 @@ class Ui_AutoSegmentationWidget(object):
 
         self.verticalLayout_4.addWidget(self.segmentationValueLineEdit)
 
+        self.suggestThresholdPushButton = QPushButton(self.groupBox)
+        self.suggestThresholdPushButton.setObjectName(u"suggestThresholdPushButton")
+
+        self.verticalLayout_4.addWidget(self.suggestThresholdPushButton)
+
 
         self.horizontalLayout_2.addLayout(self.verticalLayout_4)
 
@@ -154,6 +159,16 @@ class Ui_AutoSegmentationWidget(object):
 
         self.formLayout_2.setWidget(3, QFormLayout.LabelRole, self.label_6)
 
+        self.label_13 = QLabel(self.groupBoxImage)
+        self.label_13.setObjectName(u"label_13")
+
+        self.formLayout_2.setWidget(4, QFormLayout.LabelRole, self.label_13)
+
+        self.regionOfInterestLineEdit = QLineEdit(self.groupBoxImage)
+        self.regionOfInterestLineEdit.setObjectName(u"regionOfInterestLineEdit")
+
+        self.formLayout_2.setWidget(4, QFormLayout.FieldRole, self.regionOfInterestLineEdit)
+
 
         self.verticalLayout_3.addWidget(self.groupBoxImage)
 
@@ -161,6 +176,16 @@ class Ui_AutoSegmentationWidget(object):
         self.groupBoxSegmentation.setObjectName(u"groupBoxSegmentation")
         self.formLayout = QFormLayout(self.groupBoxSegmentation)
         self.formLayout.setObjectName(u"formLayout")
+        self.label_12 = QLabel(self.groupBoxSegmentation)
+        self.label_12.setObjectName(u"label_12")
+
+        self.formLayout.setWidget(1, QFormLayout.LabelRole, self.label_12)
+
+        self.isosurfaceEngineComboBox = QComboBox(self.groupBoxSegmentation)
+        self.isosurfaceEngineComboBox.setObjectName(u"isosurfaceEngineComboBox")
+
+        self.formLayout.setWidget(1, QFormLayout.FieldRole, self.isosurfaceEngineComboBox)
+
         self.allowHighTessellationsCheckBox = QCheckBox(self.groupBoxSegmentation)
         self.allowHighTessellationsCheckBox.setObjectName(u"allowHighTessellationsCheckBox")
 
@@ -196,6 +221,11 @@ class Ui_AutoSegmentationWidget(object):
 
         self.formLayout.setWidget(7, QFormLayout.FieldRole, self.pointSizeLineEdit)
 
+        self.evenPointSpacingCheckBox = QCheckBox(self.groupBoxSegmentation)
+        self.evenPointSpacingCheckBox.setObjectName(u"evenPointSpacingCheckBox")
+
+        self.formLayout.setWidget(8, QFormLayout.FieldRole, self.evenPointSpacingCheckBox)
+
         self.checkBoxTargetSpecificValue = QCheckBox(self.groupBoxSegmentation)
         self.checkBoxTargetSpecificValue.setObjectName(u"checkBoxTargetSpecificValue")
 
@@ -364,12 +394,27 @@ class Ui_AutoSegmentationWidget(object):
         self.groupBox.setTitle(QCoreApplication.translate("AutoSegmentationWidget", u"Auto Segmentation Viewer", None))
         self.label.setText(QCoreApplication.translate("AutoSegmentationWidget", u"Image Plane Level", None))
         self.label_2.setText(QCoreApplication.translate("AutoSegmentationWidget", u"Segmentation Contour Threshold", None))
+#if QT_CONFIG(tooltip)
+        self.suggestThresholdPushButton.setToolTip(QCoreApplication.translate("AutoSegmentationWidget", u"Suggest segmentation thresholds from the image histogram.", None))
+#endif // QT_CONFIG(tooltip)
+        self.suggestThresholdPushButton.setText(QCoreApplication.translate("AutoSegmentationWidget", u"Suggest", None))
         self.groupBoxImage.setTitle(QCoreApplication.translate("AutoSegmentationWidget", u"Image", None))
         self.label_7.setText(QCoreApplication.translate("AutoSegmentationWidget", u"Dimensions:", None))
         self.imagePixelOutputLabel.setText(QCoreApplication.translate("AutoSegmentationWidget", u"AxBxC px", None))
         self.overrideScalingCheckBox.setText(QCoreApplication.translate("AutoSegmentationWidget", u"Override pre-dertermined scaling", None))
         self.label_6.setText(QCoreApplication.translate("AutoSegmentationWidget", u"Scaling:", None))
+        self.label_13.setText(QCoreApplication.translate("AutoSegmentationWidget", u"Region of Interest:", None))
+#if QT_CONFIG(tooltip)
+        self.regionOfInterestLineEdit.setToolTip(QCoreApplication.translate("AutoSegmentationWidget", u"Pixel box to segment as x0, y0, z0, x1, y1, z1.\n"
+"Leave empty to segment the whole image.", None))
+#endif // QT_CONFIG(tooltip)
+        self.regionOfInterestLineEdit.setPlaceholderText(QCoreApplication.translate("AutoSegmentationWidget", u"Whole image", None))
         self.groupBoxSegmentation.setTitle(QCoreApplication.translate("AutoSegmentationWidget", u"Segmentation", None))
+        self.label_12.setText(QCoreApplication.translate("AutoSegmentationWidget", u"Surface Engine:", None))
+#if QT_CONFIG(tooltip)
+        self.isosurfaceEngineComboBox.setToolTip(QCoreApplication.translate("AutoSegmentationWidget", u"Zinc contours are calculated on the tessellation of the image element.\n"
+"The voxel isosurface is calculated once for every voxel of the image.", None))
+#endif // QT_CONFIG(tooltip)
 #if QT_CONFIG(tooltip)
         self.allowHighTessellationsCheckBox.setToolTip(QCoreApplication.translate("AutoSegmentationWidget", u"High tessellations are turned off by default because it may take the contour\n"
 "calcuation en exceedingly long time to be calcuated.", None))
@@ -379,6 +424,11 @@ class Ui_AutoSegmentationWidget(object):
         self.tessellationDivisionsLineEdit.setText("")
         self.label_5.setText(QCoreApplication.translate("AutoSegmentationWidget", u"Point Density:", None))
         self.label_8.setText(QCoreApplication.translate("AutoSegmentationWidget", u"Point Size:", None))
+#if QT_CONFIG(tooltip)
+        self.evenPointSpacingCheckBox.setToolTip(QCoreApplication.translate("AutoSegmentationWidget", u"Spread the generated points evenly over the surface, keeping them\n"
+"a minimum distance apart, so fewer points cover the surface.", None))
+#endif // QT_CONFIG(tooltip)
+        self.evenPointSpacingCheckBox.setText(QCoreApplication.translate("AutoSegmentationWidget", u"Even point spacing", None))
 #if QT_CONFIG(tooltip)
         self.checkBoxTargetSpecificValue.setToolTip(QCoreApplication.translate("AutoSegmentationWidget", u"When dealing with discrete values in the data, this option\n"
 " can be used to target single values within the data.\n"
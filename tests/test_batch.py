@@ -0,0 +1,64 @@
+"""
+Created: October, 2026
+
+Tests of the headless batch segmentation runner.
+"""
+import os
+
+import numpy as np
+import pytest
+
+from PIL import Image
+
+from mapclientplugins.autosegmentationstep.batch import (
+    MEMORY_PER_VOLUME_BYTE, ImageStack, estimate_stack_memory, get_worker_count, segment_stacks)
+
+
+def _write_stack(directory, size=(8, 6), count=3):
+    os.makedirs(directory, exist_ok=True)
+    for index in range(count):
+        Image.fromarray(np.full(size[::-1], index * 10, dtype=np.uint8)).save(os.path.join(directory, f"slice_{index:02}.png"))
+
+
+def test_image_stack_finds_image_files_in_directories(tmp_path):
+    for name in ["b.PNG", "a.tif", "c.jpeg", "notes.txt", "d.dcm", "settings.json"]:
+        (tmp_path / name).write_bytes(b"")
+    os.makedirs(tmp_path / "sub.png")
+    explicit_file = str(tmp_path / "notes.txt")
+
+    image_files = ImageStack([str(tmp_path), explicit_file]).image_files()
+
+    assert image_files == [str(tmp_path / name) for name in ["a.tif", "b.PNG", "c.jpeg"]] + [explicit_file]
+
+
+def test_estimate_stack_memory_scales_with_volume_size(tmp_path):
+    _write_stack(str(tmp_path), size=(8, 6), count=3)
+    assert estimate_stack_memory(str(tmp_path)) == 8 * 6 * 3 * MEMORY_PER_VOLUME_BYTE
+
+
+def test_get_worker_count_is_at_least_one():
+    assert get_worker_count([], 4) == 1
+    assert get_worker_count([1, 1, 1], 2) == 2
+
+
+def test_unreadable_stack_fails_on_its_own(tmp_path):
+    stack = str(tmp_path / "unreadable")
+    os.makedirs(stack)
+    with open(os.path.join(stack, "slice_00.png"), "wb") as f:
+        f.write(b"not an image")
+    missing_stack = str(tmp_path / "missing")
+
+    reported = []
+    summaries = segment_stacks([stack, missing_stack], {}, progress_callback=reported.append)
+
+    assert [summary["stack"] for summary in summaries] == [stack, missing_stack]
+    assert all(summary["error"] is not None and summary["timings"] == [] for summary in summaries)
+    assert len(reported) == 2
+
+
+def test_shared_output_directory_is_rejected(tmp_path):
+    stacks = [str(tmp_path / "a"), str(tmp_path / "b")]
+
+    with pytest.raises(ValueError):
+        segment_stacks(stacks, {}, output_directory=str(tmp_path / "output"))
+    assert not os.path.exists(tmp_path / "output")
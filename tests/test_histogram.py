@@ -0,0 +1,53 @@
+"""
+Created: October, 2026
+
+Tests of the intensity histogram shown by the Show Histogram button.
+"""
+import numpy as np
+import pytest
+
+matplotlib = pytest.importorskip("matplotlib")
+matplotlib.use("Agg")
+
+from matplotlib.figure import Figure  # noqa: E402
+
+from mapclientplugins.autosegmentationstep.model.histogram import calculate_volume_histogram, plot_histogram  # noqa: E402
+from mapclientplugins.autosegmentationstep.model.threshold import (  # noqa: E402
+    THRESHOLD_METHOD_OTSU, calculate_threshold, parse_threshold_method)
+
+
+def _create_volume():
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 256, size=(16, 12, 8), dtype=np.uint8)
+
+
+def test_volume_histogram_counts_every_voxel():
+    volume = _create_volume()
+    histogram = calculate_volume_histogram(volume)
+
+    assert histogram.get_total() == volume.size
+    assert len(histogram.get_bin_edges()) == histogram.get_bin_count() + 1
+    assert histogram.get_range() == (volume.min() / 255.0, volume.max() / 255.0)
+
+
+def test_plot_histogram_draws_counts_over_bin_edges():
+    histogram = calculate_volume_histogram(_create_volume())
+    axes = Figure().subplots()
+    plot_histogram(histogram, axes)
+
+    assert len(axes.patches) == 1
+    values, edges, _ = axes.patches[0].get_data()
+    np.testing.assert_array_equal(values, histogram.get_counts())
+    np.testing.assert_array_equal(edges, histogram.get_bin_edges())
+    assert axes.get_ylabel() == 'Frequency'
+
+
+def test_otsu_threshold_separates_two_intensity_classes():
+    volume = np.zeros((16, 12, 8), dtype=np.uint8)
+    volume[:, :, :3] = 40
+    volume[:, :, 3:] = 200
+    histogram = calculate_volume_histogram(volume)
+
+    threshold = calculate_threshold(histogram, *parse_threshold_method(THRESHOLD_METHOD_OTSU))
+
+    assert 40 / 255.0 <= threshold < 200 / 255.0
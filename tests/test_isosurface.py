@@ -0,0 +1,46 @@
+"""
+Created: October, 2026
+
+Tests of the voxel isosurface extraction.
+"""
+import numpy as np
+
+from mapclientplugins.autosegmentationstep.model.blockindex import BlockIndex
+from mapclientplugins.autosegmentationstep.model.isosurface import extract_isosurface, iterate_isosurface
+
+
+def _triangle_coordinates(vertices, triangles):
+    # Triangles by the coordinates of their vertices, rotated to start at the smallest vertex to keep their orientation.
+    result = []
+    for triangle in np.asarray(vertices)[triangles].tolist():
+        start = triangle.index(min(triangle))
+        result.append(triangle[start:] + triangle[:start])
+
+    return sorted(result)
+
+
+def _stream(values, iso_value, **kwargs):
+    surfaces = list(iterate_isosurface(values, iso_value, **kwargs))
+    return np.concatenate([s.get_vertices() for s in surfaces]), np.concatenate([s.get_triangles() for s in surfaces])
+
+
+def test_streamed_surface_matches_extracted_surface():
+    # Integer values equal to the iso-value put vertices on grid points shared by several edges.
+    values = np.random.default_rng(0).integers(0, 5, size=(12, 9, 14)).astype(np.float32)
+    surface = extract_isosurface(values, 2.0)
+    blocks = BlockIndex(values).get_active_cells(2.0)
+
+    for kwargs in ({"thickness": 3}, {"thickness": 4, "blocks": blocks}):
+        vertices, triangles = _stream(values, 2.0, **kwargs)
+
+        assert len(vertices) == surface.get_vertex_count()
+        assert _triangle_coordinates(vertices, triangles) == _triangle_coordinates(surface.get_vertices(), surface.get_triangles())
+
+
+def test_surface_has_no_duplicate_vertices_or_degenerate_triangles():
+    values = np.random.default_rng(1).integers(0, 3, size=(10, 10, 10)).astype(np.float32)
+    vertices, triangles = _stream(values, 1.0, thickness=2)
+
+    assert len(np.unique(vertices, axis=0)) == len(vertices)
+    assert np.array_equal(np.unique(triangles), np.arange(len(vertices)))
+    assert np.all((triangles[:, 0] != triangles[:, 1]) & (triangles[:, 1] != triangles[:, 2]) & (triangles[:, 2] != triangles[:, 0]))
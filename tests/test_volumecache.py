@@ -0,0 +1,43 @@
+"""
+Created: October, 2026
+
+Tests of the on-disk cache of decoded image volumes.
+"""
+import numpy as np
+
+from mapclientplugins.autosegmentationstep.model.volumecache import VolumeCache
+
+
+def _commit_volume(volume_cache, key, shape):
+    volume = volume_cache.allocate(shape, np.uint8)
+    volume[:] = 1
+    temporary_file = volume.filename
+    volume.flush()
+    del volume
+    return volume_cache.commit(key, temporary_file)
+
+
+def test_pinned_volume_larger_than_the_cache_is_kept(tmp_path):
+    volume_cache = VolumeCache(str(tmp_path), max_size=1000)
+    volume_cache.pin("volume")
+    volume = _commit_volume(volume_cache, "volume", (20, 20, 20))
+    assert volume is not None
+
+    assert volume_cache.store_arrays("histogram", {"counts": np.zeros(10)})
+    assert volume_cache.store("pyramid-2", np.zeros((5, 5, 5), dtype=np.float32))
+
+    assert volume_cache.contains("volume")
+    assert volume_cache.contains("pyramid-2")
+    np.testing.assert_array_equal(volume_cache.load("volume"), volume)
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    volume_cache = VolumeCache(str(tmp_path), max_size=1000)
+    volume = _commit_volume(volume_cache, "volume", (20, 20, 20))
+    assert volume is not None
+    del volume
+
+    assert volume_cache.store("pyramid-2", np.zeros((5, 5, 5), dtype=np.float32))
+
+    assert not volume_cache.contains("volume")
+    assert volume_cache.contains("pyramid-2")